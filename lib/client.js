@@ -1,13 +1,86 @@
 const fs = require('fs');
 const path = require('path');
 const os = require('os');
+const http = require('http');
+const https = require('https');
 const fetch = require('node-fetch');
 const readline = require('readline');
+const zlib = require('zlib');
 const { createLogger } = require('./logger');
 
 // Set up database for different environments
 let openDB;
 let isFileSystem = false;
+let sqliteDbPath = null; // Set when IndexedDBShim (SQLite) backs the store
+const appliedJournalModes = new Map(); // sqlite file -> journal mode set by us
+
+const SQLITE_JOURNAL_MODES = ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'];
+
+/**
+ * Set the journal mode of the SQLite files behind IndexedDBShim.
+ *
+ * IndexedDBShim owns its connections and exposes no pragma hook, but
+ * journal_mode=WAL is persistent in the database file, so setting it once
+ * from a side connection applies to every later connection. With WAL a
+ * commit is a single append to the log instead of the rollback journal's
+ * write + fsync pair. Per-connection pragmas (synchronous, cache_size,
+ * mmap_size, temp_store) cannot be applied to the shim's connection this way.
+ * All access comes from the single JS thread, so there is no per-thread
+ * connection or SQLite threading mode to tune either.
+ *
+ * Best-effort: if better-sqlite3 is unavailable the current journal is kept.
+ * @param {string} journalMode - One of SQLITE_JOURNAL_MODES
+ * @param {Object} logger - Logger for diagnostics
+ */
+function applySqliteJournalMode(journalMode, logger) {
+  if (!sqliteDbPath) return;
+  try {
+    const Database = require('better-sqlite3');
+    for (const file of fs.readdirSync(sqliteDbPath)) {
+      if (!file.endsWith('.sqlite') || appliedJournalModes.get(file) === journalMode) continue;
+      const sqlite = new Database(path.join(sqliteDbPath, file));
+      try {
+        sqlite.pragma(`journal_mode = ${journalMode}`);
+        appliedJournalModes.set(file, journalMode);
+      } finally {
+        sqlite.close();
+      }
+    }
+  } catch (err) {
+    logger.debug(`SQLite journal_mode=${journalMode} not applied: ${err.message}`);
+  }
+}
+
+/**
+ * Fold the WAL of the SQLite files behind IndexedDBShim back into the
+ * database and truncate it.
+ *
+ * Run after an upload pass: deleting uploaded chunks grows the WAL, and
+ * without this it is only checkpointed (on the shim's connection) at some
+ * later commit, which then pays for the whole backlog. A TRUNCATE checkpoint
+ * cannot complete while another connection is mid-transaction; SQLite then
+ * reports it busy and the next pass tries again.
+ *
+ * Best-effort, like applySqliteJournalMode; only files we switched to WAL.
+ * @param {Object} logger - Logger for diagnostics
+ */
+function checkpointSqliteWal(logger) {
+  if (!sqliteDbPath) return;
+  try {
+    const Database = require('better-sqlite3');
+    for (const [file, journalMode] of appliedJournalModes) {
+      if (journalMode !== 'WAL') continue;
+      const sqlite = new Database(path.join(sqliteDbPath, file));
+      try {
+        sqlite.pragma('wal_checkpoint(TRUNCATE)');
+      } finally {
+        sqlite.close();
+      }
+    }
+  } catch (err) {
+    logger.debug(`SQLite WAL checkpoint skipped: ${err.message}`);
+  }
+}
 
 if (typeof window === 'undefined') {
   // Node.js environment
@@ -42,6 +115,7 @@ if (typeof window === 'undefined') {
       setGlobalVars(global, { checkOrigin: false, databaseBasePath: dbPath });
       const { openDB: idbOpenDB } = require('idb');
       openDB = idbOpenDB;
+      sqliteDbPath = dbPath;
     } catch (err) {
       // Fallback to fake-indexeddb if indexeddbshim fails to load
       console.warn('[IndexedCP] IndexedDBShim not available, falling back to in-memory storage. Install node-sqlite3 for persistence.');
@@ -56,15 +130,258 @@ if (typeof window === 'undefined') {
   openDB = idbOpenDB;
 }
 
+// A compressed chunk is kept only if it is below this fraction of the original
+const COMPRESSION_MAX_RATIO = 0.95;
+
+/**
+ * Compress a chunk for storage/upload.
+ * zstd (default level 3) is used when the runtime's zlib provides it,
+ * otherwise gzip (level 1).
+ * @param {Buffer} data - Raw chunk
+ * @param {string} encoding - 'gzip' or 'zstd'
+ * @returns {Buffer|null} - Compressed chunk, or null if compression does not
+ *   pay off (already-compressed or random data)
+ */
+function compressChunk(data, encoding) {
+  const compressed = encoding === 'zstd'
+    ? zlib.zstdCompressSync(data)
+    : zlib.gzipSync(data, { level: 1 });
+  return compressed.length < data.length * COMPRESSION_MAX_RATIO ? compressed : null;
+}
+
+/**
+ * Resolve the `compression` option to a Content-Encoding token (or null)
+ * @param {boolean|string} option - false, true, 'gzip' or 'zstd'
+ * @returns {string|null}
+ */
+function resolveCompression(option) {
+  if (!option) return null;
+  if (option === 'zstd' && typeof zlib.zstdCompressSync === 'function') {
+    return 'zstd';
+  }
+  return 'gzip';
+}
+
+// addFile commits chunks in batches bounded by record count and bytes
+const ADD_BATCH_MAX_RECORDS = 64;
+const ADD_BATCH_MAX_BYTES = 64 * 1024 * 1024;
+
+/**
+ * Precompute backoff delays (whole ms) for retries 1, 2, ... up to the point
+ * where they reach maxDelay (at most 64 entries). Retries past the end of the
+ * table use its last entry.
+ * @param {number} initialDelay - Delay before the first retry
+ * @param {number} multiplier - Growth factor per retry
+ * @param {number} maxDelay - Upper bound on any delay
+ * @returns {number[]} Backoff table
+ */
+function buildBackoffTable(initialDelay, multiplier, maxDelay) {
+  const table = [];
+  let delay = initialDelay;
+  while (table.length < 64) {
+    table.push(Math.round(Math.min(delay, maxDelay)));
+    if (delay >= maxDelay) break;
+    delay *= multiplier;
+  }
+  return table;
+}
+
+// Uploaded chunks (and packets) are cleared from the buffer in batches of this size
+const DELETE_BATCH_MAX_RECORDS = 64;
+
+/**
+ * A stored packet without its ciphertext, for status and retry updates:
+ * EncryptedDB keeps the payload file of records put without it, so the
+ * ciphertext is not rewritten on every status change
+ */
+const withoutPayload = ({ ciphertext, ...packet }) => packet;
+
+// Keep-alive agents shared by all requests. Without an agent node-fetch sends
+// `Connection: close`, so every chunk would pay a new TCP (and TLS) handshake.
+const httpAgent = new http.Agent({ keepAlive: true });
+const httpsAgent = new https.Agent({ keepAlive: true });
+const selectAgent = (parsedUrl) => (parsedUrl.protocol === 'http:' ? httpAgent : httpsAgent);
+
+/**
+ * Map items through an async function with at most `limit` calls in flight.
+ * Resolves to results in input order; rejects with the first error (workers
+ * stop taking new items once one has failed).
+ * @param {Array} items - Inputs
+ * @param {number} limit - Maximum concurrent calls
+ * @param {Function} fn - async (item, index) => result
+ * @returns {Promise<Array>}
+ */
+async function mapWithConcurrency(items, limit, fn) {
+  const results = new Array(items.length);
+  let next = 0;
+  let failed = false;
+  
+  const worker = async () => {
+    while (!failed && next < items.length) {
+      const index = next++;
+      try {
+        results[index] = await fn(items[index], index);
+      } catch (error) {
+        failed = true;
+        throw error;
+      }
+    }
+  };
+  
+  const workerCount = Math.max(1, Math.min(limit, items.length));
+  await Promise.all(Array.from({ length: workerCount }, worker));
+  return results;
+}
+
+/**
+ * Like mapWithConcurrency, but never rejects: resolves to
+ * Promise.allSettled-style `{ status, value | reason }` entries
+ */
+function settleWithConcurrency(items, limit, fn) {
+  return mapWithConcurrency(items, limit, (item, index) =>
+    Promise.resolve()
+      .then(() => fn(item, index))
+      .then(value => ({ status: 'fulfilled', value }), reason => ({ status: 'rejected', reason }))
+  );
+}
+
+/**
+ * View binary data as a Buffer without copying.
+ * Buffer.from(buffer) copies the bytes; records read back from IndexedDB are
+ * plain Uint8Arrays, so wrap their backing memory instead. Anything else
+ * (e.g. a plain byte array) still goes through Buffer.from.
+ * @param {Buffer|Uint8Array|Object} data
+ * @returns {Buffer}
+ */
+function asBuffer(data) {
+  if (Buffer.isBuffer(data)) return data;
+  if (ArrayBuffer.isView(data)) return Buffer.from(data.buffer, data.byteOffset, data.byteLength);
+  return Buffer.from(data);
+}
+
+/**
+ * Read a file as consecutive chunks using positional reads on one handle.
+ * Each chunk is its own exactly-sized allocation (the last one included), so
+ * a chunk never drags a larger shared backing store into IndexedDB's
+ * structured clone and needs no trimming copy.
+ * @param {string} filePath - File to read
+ * @param {number} chunkSize - Bytes per chunk
+ * @yields {Buffer}
+ */
+async function* readFileChunks(filePath, chunkSize) {
+  const handle = await fs.promises.open(filePath, 'r');
+  try {
+    const { size } = await handle.stat();
+    for (let position = 0; position < size; position += chunkSize) {
+      const length = Math.min(chunkSize, size - position);
+      const buffer = Buffer.allocUnsafeSlow(length);
+      let filled = 0;
+      while (filled < length) {
+        const { bytesRead } = await handle.read(buffer, filled, length - filled, position + filled);
+        if (bytesRead === 0) break; // File shrank while reading
+        filled += bytesRead;
+      }
+      yield filled === length ? buffer : buffer.subarray(0, filled);
+      if (filled < length) return;
+    }
+  } finally {
+    await handle.close();
+  }
+}
+
+/**
+ * Error for an upload that fails the same way however often it is retried.
+ * Background uploads give up on the chunk instead of backing off.
+ * @param {string} message
+ * @returns {Error}
+ */
+function permanentError(message) {
+  const error = new Error(message);
+  error.permanent = true;
+  return error;
+}
+
+/**
+ * Fresh retry metadata, created the first time an upload fails
+ * @param {string} [id] - Chunk id (key of the retries store)
+ * @returns {Object}
+ */
+function createRetryMetadata(id) {
+  const metadata = {
+    retryCount: 0,
+    lastAttempt: null,
+    nextRetry: 0,
+    permanent: false,
+    errors: []
+  };
+  if (id !== undefined) {
+    metadata.id = id;
+  }
+  return metadata;
+}
+
+/**
+ * Build a chunk record for the unencrypted store.
+ * Every record has the same fields in the same order, so records share one
+ * shape and the upload loop's property reads stay monomorphic.
+ *
+ * A record either carries its bytes in `data`, or is a descriptor
+ * (`data: null`) pointing at `length` bytes at `offset` in the source file,
+ * which are re-read at upload time. Descriptors keep the file's absolute
+ * path, size and mtime, so they can be re-read from any working directory
+ * and a file changed since is detected.
+ * @param {string} fileName - Client file name
+ * @param {number} chunkIndex - Chunk index within the file
+ * @param {Buffer|null} data - Chunk payload (possibly compressed), or null for a descriptor
+ * @param {string|null} encoding - Content-Encoding of data, or null if raw
+ * @param {number|null} [offset=null] - Byte offset in the source file (descriptors)
+ * @param {number|null} [length=null] - Byte length in the source file (descriptors)
+ * @param {{path: string, size: number, mtimeMs: number}|null} [source=null] - Source file (descriptors)
+ * @returns {Object} - Chunk record
+ */
+function createChunkRecord(fileName, chunkIndex, data, encoding, offset = null, length = null, source = null) {
+  return {
+    id: `${fileName}-${chunkIndex}`,
+    fileName,
+    chunkIndex,
+    data,
+    encoding,
+    offset,
+    length,
+    sourcePath: source ? source.path : null,
+    sourceSize: source ? source.size : null,
+    sourceMtime: source ? source.mtimeMs : null
+  };
+}
+
 class IndexedCPClient {
   constructor(options = {}) {
     this.db = null;
     this.dbName = options.dbName || 'indexcp';
     this.storeName = options.storeName || 'chunks';
     this.apiKey = options.apiKey || null;
-    this.chunkSize = options.chunkSize || 1024 * 1024; // Default 1MB
+    // Default 4MB, raised to 4x the filesystem block size on devices with
+    // large blocks. An explicit chunkSize is used as-is.
+    this.chunkSize = options.chunkSize || 4 * 1024 * 1024;
+    this.chunkSizeExplicit = Boolean(options.chunkSize);
+    
+    // Journal mode for the SQLite files behind IndexedDBShim (production
+    // storage only). Default 'WAL'; false keeps whatever the file has.
+    const journalMode = options.sqliteJournalMode === undefined ? 'WAL' : options.sqliteJournalMode;
+    if (journalMode && !SQLITE_JOURNAL_MODES.includes(String(journalMode).toUpperCase())) {
+      throw new Error(`Invalid sqliteJournalMode: ${journalMode}. Must be one of: ${SQLITE_JOURNAL_MODES.join(', ')}`);
+    }
+    this.sqliteJournalMode = journalMode ? String(journalMode).toUpperCase() : null;
     this.serverUrl = options.serverUrl || null;
     
+    // Maximum files (or encrypted sessions) uploaded at once. Chunks within
+    // a file are always sent in order, one at a time.
+    this.uploadConcurrency = options.uploadConcurrency || 4;
+    
+    // Optional chunk compression (false, true/'gzip', 'zstd'). Chunks are
+    // compressed before they are buffered and sent with Content-Encoding.
+    this.compression = resolveCompression(options.compression);
+    
     // Logger configuration
     this.logger = createLogger({
       level: options.logLevel,
@@ -76,6 +393,7 @@ class IndexedCPClient {
     this.initialRetryDelay = options.initialRetryDelay || 1000; // 1 second
     this.maxRetryDelay = options.maxRetryDelay || 60000; // 60 seconds max
     this.retryMultiplier = options.retryMultiplier || 2; // Exponential backoff
+    this.backoffTable = buildBackoffTable(this.initialRetryDelay, this.retryMultiplier, this.maxRetryDelay);
     
     // Background upload state
     this.backgroundUploadTimer = null;
@@ -94,8 +412,12 @@ class IndexedCPClient {
       
       this.cryptoUtils = cryptoUtils;
       this.encryptedDB = openEncryptedDB;
+      // Directory for encrypted buffers (default ~/.indexcp/encrypted-db, or
+      // INDEXEDCP_ENCRYPTED_DB_PATH)
+      this.encryptedDbPath = options.encryptedDbPath || null;
       this.sessionKeys = new Map(); // sessionId -> AES key (in memory only during capture)
       this.sessionSeqCounters = new Map(); // sessionId -> next sequence number (auto-increment)
+      this.sessionBinaryAAD = new Map(); // sessionId -> whether the server accepts binary AAD
     }
   }
 
@@ -165,16 +487,34 @@ class IndexedCPClient {
     if (!this.db) {
       if (this.encryption) {
         // Use encrypted database schema
-        this.db = await this.encryptedDB(this.dbName, 3);
+        this.db = await this.encryptedDB(this.dbName, 3, { dbPath: this.encryptedDbPath });
       } else {
         // Use original simple schema
-        this.db = await openDB(this.dbName, 1, {
-          upgrade(db) {
-            if (!db.objectStoreNames.contains('chunks')) {
-              db.createObjectStore('chunks', { keyPath: 'id', autoIncrement: true });
+        this.db = await openDB(this.dbName, 4, {
+          upgrade(db, oldVersion, newVersion, transaction) {
+            const store = db.objectStoreNames.contains('chunks')
+              ? transaction.objectStore('chunks')
+              : db.createObjectStore('chunks', { keyPath: 'id', autoIncrement: true });
+            // v2: chunks ordered by file then index, so reads need no sort
+            if (!store.indexNames.contains('byFile')) {
+              store.createIndex('byFile', ['fileName', 'chunkIndex']);
+            }
+            // v3: retry state kept apart from chunk payloads (keyed by chunk id)
+            const retries = db.objectStoreNames.contains('retries')
+              ? transaction.objectStore('retries')
+              : db.createObjectStore('retries', { keyPath: 'id' });
+            // v4: find waiting/exhausted chunks without scanning every entry
+            if (!retries.indexNames.contains('byNextRetry')) {
+              retries.createIndex('byNextRetry', 'nextRetry');
+            }
+            if (!retries.indexNames.contains('byRetryCount')) {
+              retries.createIndex('byRetryCount', 'retryCount');
             }
           }
         });
+        if (this.sqliteJournalMode) {
+          applySqliteJournalMode(this.sqliteJournalMode, this.logger);
+        }
       }
     }
     return this.db;
@@ -196,13 +536,17 @@ class IndexedCPClient {
       throw new Error('serverUrl required for fetchPublicKey()');
     }
     
-    const response = await fetch(`${this.serverUrl}/public-key`);
+    const response = await fetch(`${this.serverUrl}/public-key`, { agent: selectAgent });
     
     if (!response.ok) {
       throw new Error(`Failed to fetch public key: ${response.statusText}`);
     }
     
     const publicKeyInfo = await response.json();
+    // Servers from before binary AAD JSON.parse every AAD; they do not
+    // advertise aadFormats, and get JSON AAD
+    publicKeyInfo.binaryAAD = Array.isArray(publicKeyInfo.aadFormats) &&
+      publicKeyInfo.aadFormats.includes('binary');
     
     // Cache the public key in IndexedDB
     const db = await this.initDB();
@@ -211,7 +555,8 @@ class IndexedCPClient {
       kid: publicKeyInfo.kid,
       publicKey: publicKeyInfo.publicKey,
       fetchedAt: Date.now(),
-      expiresAt: publicKeyInfo.expiresAt
+      expiresAt: publicKeyInfo.expiresAt,
+      binaryAAD: publicKeyInfo.binaryAAD
     });
     await tx.done;
     
@@ -294,6 +639,8 @@ class IndexedCPClient {
     
     // Initialize sequence counter for this session
     this.sessionSeqCounters.set(sessionId, 0);
+    // Keys cached before servers advertised aadFormats have no binaryAAD
+    this.sessionBinaryAAD.set(sessionId, publicKeyInfo.binaryAAD === true);
     
     this.logger.info(`✓ Started encrypted stream: ${sessionId} for ${fileName}`);
     return sessionId;
@@ -327,17 +674,28 @@ class IndexedCPClient {
       this.sessionSeqCounters.set(sessionId, seq + 1);
     }
     
-    // Encrypt packet
+    // Store encrypted packet
+    const record = await this._createPacketRecord(sessionKey, sessionId, data, seq);
+    const tx = db.transaction('packets', 'readwrite');
+    await tx.objectStore('packets').put(record);
+    await tx.done;
+  }
+
+  /**
+   * Encrypt data into a packet record for the packets store
+   * @private
+   */
+  async _createPacketRecord(sessionKey, sessionId, data, seq) {
+    const now = Date.now();
     const encrypted = await this.cryptoUtils.encryptPacket(data, sessionKey, {
       sessionId,
       seq,
       codec: 'raw',
-      timestamp: Date.now()
+      timestamp: now,
+      binaryAAD: this.sessionBinaryAAD.get(sessionId) === true
     });
     
-    // Store encrypted packet
-    const tx = db.transaction('packets', 'readwrite');
-    await tx.objectStore('packets').put({
+    return {
       id: `${sessionId}-${seq}`,
       sessionId,
       seq,
@@ -346,9 +704,8 @@ class IndexedCPClient {
       authTag: encrypted.authTag,
       aad: encrypted.aad,
       status: 'pending',
-      createdAt: Date.now()
-    });
-    await tx.done;
+      createdAt: now
+    };
   }
 
   /**
@@ -361,20 +718,20 @@ class IndexedCPClient {
     
     const db = await this.initDB();
     
-    const [sessions, packets, keys] = await Promise.all([
-      db.getAll('sessions'),
-      db.getAll('packets'),
+    // Counts come from the store index; packet payloads are never read
+    const [activeSessions, pendingPackets, keys] = await Promise.all([
+      db.count('sessions'),
+      db.countFromIndex('packets', 'status', 'pending'),
       db.getAll('keyCache')
     ]);
     
-    const pendingPackets = packets.filter(p => p.status === 'pending');
     const currentKey = keys.length > 0 ? keys[keys.length - 1].kid : null;
     
     return {
       encryption: true,
       isEncrypted: true,
-      activeSessions: sessions.length,
-      pendingPackets: pendingPackets.length,
+      activeSessions,
+      pendingPackets,
       cachedKeys: keys.length,
       currentKeyId: currentKey
     };
@@ -384,6 +741,19 @@ class IndexedCPClient {
   // End Encryption Methods
   // ============================================================================
 
+  /**
+   * Chunk size to use for a file: the configured chunkSize, or, when it was
+   * not set explicitly, max(default, 4 * st_blksize) of the file's filesystem
+   * @private
+   */
+  async _chunkSizeFor(filePath) {
+    if (this.chunkSizeExplicit) {
+      return this.chunkSize;
+    }
+    const { blksize } = await fs.promises.stat(filePath);
+    return Math.max(this.chunkSize, 4 * (blksize || 0));
+  }
+
   async addFile(filePath) {
     const db = await this.initDB();
     
@@ -392,38 +762,55 @@ class IndexedCPClient {
       return this.addFileEncrypted(filePath);
     }
     
-    // Original unencrypted logic
-    return new Promise((resolve, reject) => {
-      const readStream = fs.createReadStream(filePath, { highWaterMark: this.chunkSize });
-      let chunkIndex = 0;
-      const fileName = filePath;
-      const chunks = [];
-
-      readStream.on('data', (chunk) => {
-        chunks.push({
-          id: `${fileName}-${chunkIndex}`, 
-          fileName: fileName,
-          chunkIndex: chunkIndex,
-          data: chunk 
-        });
+    const chunkSize = await this._chunkSizeFor(filePath);
+    const fileName = filePath;
+    let chunkIndex = 0;
+    let batch = [];
+    let batchBytes = 0;
+    let pendingCommit = Promise.resolve();
+    
+    // Chunks are written in batches, one transaction per batch, instead of
+    // one transaction per chunk. Batches are bounded by count and bytes.
+    // The next batch is read while the previous one commits (double
+    // buffering), so at most two batches are held in memory.
+    try {
+      for await (const chunk of readFileChunks(filePath, chunkSize)) {
+        // encoding is stored per record so mixed (compressed/raw) buffers upload
+        // correctly; chunks that do not compress well are stored raw
+        const compressed = this.compression ? compressChunk(chunk, this.compression) : null;
+        const data = compressed || chunk;
+        batch.push(createChunkRecord(fileName, chunkIndex, data, compressed ? this.compression : null));
+        batchBytes += data.length;
         chunkIndex++;
-      });
-
-      readStream.on('end', async () => {
-        try {
-          // Add all chunks to IndexedDB
-          for (const chunk of chunks) {
-            await db.add(this.storeName, chunk);
-          }
-          this.logger.info(`File ${fileName} added to buffer with ${chunkIndex} chunks`);
-          resolve(chunkIndex);
-        } catch (error) {
-          reject(error);
+        
+        if (batch.length >= ADD_BATCH_MAX_RECORDS || batchBytes >= ADD_BATCH_MAX_BYTES) {
+          await pendingCommit;
+          pendingCommit = this._addChunkBatch(db, batch);
+          pendingCommit.catch(() => {}); // Surfaced by the next await
+          batch = [];
+          batchBytes = 0;
         }
-      });
+      }
+    } finally {
+      // Never leave a commit running unobserved, even if reading failed
+      await pendingCommit;
+    }
+    if (batch.length > 0) {
+      await this._addChunkBatch(db, batch);
+    }
+    
+    this.logger.info(`File ${fileName} added to buffer with ${chunkIndex} chunks`);
+    return chunkIndex;
+  }
 
-      readStream.on('error', reject);
-    });
+  /**
+   * Add chunk records in a single readwrite transaction
+   * @private
+   */
+  async _addChunkBatch(db, records) {
+    const tx = db.transaction(this.storeName, 'readwrite');
+    const store = tx.objectStore(this.storeName);
+    await Promise.all([...records.map(record => store.add(record)), tx.done]);
   }
 
   /**
@@ -436,49 +823,39 @@ class IndexedCPClient {
     let sessionId;
     
     try {
+      const chunkSize = await this._chunkSizeFor(filePath);
+      
       // Start encrypted stream
       sessionId = await this.startStream(fileName);
+      const sessionKey = this.sessionKeys.get(sessionId);
       
-      return new Promise((resolve, reject) => {
-        const readStream = fs.createReadStream(filePath, { highWaterMark: this.chunkSize });
-        let seq = 0;
-        const packetPromises = [];
-
-        readStream.on('data', (chunk) => {
-          const currentSeq = seq++;
-          const promise = this.addPacket(sessionId, chunk, currentSeq);
-          packetPromises.push(promise);
-        });
-
-        readStream.on('end', async () => {
-          try {
-            // Wait for all packets to be encrypted and stored
-            await Promise.all(packetPromises);
-            
-            // Clear session key from memory (AC1 - keys only during capture)
-            this.sessionKeys.delete(sessionId);
-            
-            this.logger.info(`✓ File ${fileName} encrypted and buffered (${seq} packets)`);
-            resolve(sessionId);
-          } catch (error) {
-            // Clean up session key on error
-            this.sessionKeys.delete(sessionId);
-            reject(error);
-          }
-        });
-
-        readStream.on('error', (error) => {
-          // Clean up session key on error
-          this.sessionKeys.delete(sessionId);
-          reject(error);
-        });
-      });
-    } catch (error) {
-      // Clean up session key if stream start failed
+      // Packets are stored in batches: each EncryptedDB write rewrites the
+      // whole packets store, so one write per batch instead of per packet.
+      let seq = 0;
+      let batch = [];
+      let batchBytes = 0;
+      for await (const chunk of readFileChunks(filePath, chunkSize)) {
+        batch.push(await this._createPacketRecord(sessionKey, sessionId, chunk, seq++));
+        batchBytes += chunk.length;
+        
+        if (batch.length >= ADD_BATCH_MAX_RECORDS || batchBytes >= ADD_BATCH_MAX_BYTES) {
+          await db.putMany('packets', batch);
+          batch = [];
+          batchBytes = 0;
+        }
+      }
+      if (batch.length > 0) {
+        await db.putMany('packets', batch);
+      }
+      
+      this.logger.info(`✓ File ${fileName} encrypted and buffered (${seq} packets)`);
+      return sessionId;
+    } finally {
+      // Clear session key from memory (AC1 - keys only during capture)
       if (sessionId) {
         this.sessionKeys.delete(sessionId);
+        this.sessionBinaryAAD.delete(sessionId);
       }
-      throw error;
     }
   }
 
@@ -497,41 +874,40 @@ class IndexedCPClient {
     const apiKey = await this.getApiKey();
     
     const db = await this.initDB();
-    const transaction = db.transaction(this.storeName, 'readonly');
-    const store = transaction.objectStore(this.storeName);
-    const allRecords = await store.getAll();
+    // Walk the byFile index keys: chunks come back grouped by file and ordered
+    // by chunkIndex, and payloads stay on disk until each chunk is uploaded
+    const chunkKeys = await this._getChunkKeys(db);
     
-    this.logger.info(`Found ${allRecords.length} buffered chunks`);
+    this.logger.info(`Found ${chunkKeys.length} buffered chunks`);
     
-    if (allRecords.length === 0) {
+    if (chunkKeys.length === 0) {
       this.logger.info('No buffered files to upload');
       return {};
     }
     
-    // Group records by fileName
+    // Group chunks by fileName
     const fileGroups = {};
-    allRecords.forEach(record => {
-      if (!fileGroups[record.fileName]) {
-        fileGroups[record.fileName] = [];
+    chunkKeys.forEach(chunk => {
+      if (!fileGroups[chunk.fileName]) {
+        fileGroups[chunk.fileName] = [];
       }
-      fileGroups[record.fileName].push(record);
+      fileGroups[chunk.fileName].push(chunk);
     });
 
     this.logger.info(`Grouped into ${Object.keys(fileGroups).length} files:`, Object.keys(fileGroups));
 
-    // Upload all files in parallel (non-blocking)
-    const uploadPromises = Object.entries(fileGroups).map(([fileName, chunks]) =>
+    // Upload files in parallel, at most uploadConcurrency at a time
+    const results = await mapWithConcurrency(Object.entries(fileGroups), this.uploadConcurrency, ([fileName, chunks]) =>
       this.uploadFileChunks(serverUrl, fileName, chunks, db, apiKey)
     );
     
-    const results = await Promise.all(uploadPromises);
-    
     // Combine results
     const uploadResults = {};
     results.forEach(result => {
       uploadResults[result.fileName] = result.serverFilename;
     });
     
+    checkpointSqliteWal(this.logger);
     return uploadResults; // Return mapping of client filenames to server filenames
   }
 
@@ -542,28 +918,60 @@ class IndexedCPClient {
   async uploadFileChunks(serverUrl, fileName, chunks, db, apiKey) {
     this.logger.info(`Uploading ${fileName} with ${chunks.length} chunks...`);
     
-    // Sort chunks by index
-    chunks.sort((a, b) => a.chunkIndex - b.chunkIndex);
+    // Chunks arrive in chunkIndex order from the byFile index
     
     let serverFilename = null;
-    
-    // Upload chunks sequentially to preserve order
-    for (const chunk of chunks) {
-      this.logger.info(`Uploading chunk ${chunk.chunkIndex} for ${fileName}`);
-      const response = await this.uploadChunk(serverUrl, chunk.data, chunk.chunkIndex, fileName, apiKey);
-      
-      // Capture server-determined filename from first chunk response
-      if (response.data && response.data.actualFilename && !serverFilename) {
-        serverFilename = response.data.actualFilename;
+
+    // Uploads stay sequential (the server appends in arrival order), but the
+    // next chunk's read and the removal of uploaded chunks run while a chunk
+    // is on the wire. Uploaded chunks are removed in batches, one transaction
+    // per batch, and always before returning so a failure part-way through
+    // never leaves sent chunks to be sent again. The no-op catches keep a
+    // failed upload from leaving these in-flight promises as unhandled
+    // rejections; awaiting them still throws.
+    let nextChunk = chunks.length > 0 ? this._loadChunk(db, chunks[0].id) : null;
+    let pendingDelete = Promise.resolve();
+    let uploadedIds = [];
+
+    try {
+      for (let i = 0; i < chunks.length; i++) {
+        const chunk = chunks[i];
+        const loaded = await nextChunk;
+        nextChunk = i + 1 < chunks.length ? this._loadChunk(db, chunks[i + 1].id) : null;
+        if (nextChunk) nextChunk.catch(() => {});
+        if (!loaded) {
+          throw new Error(`Chunk ${chunk.chunkIndex} of ${fileName} is no longer buffered`);
+        }
+
+        this.logger.debug(`Uploading chunk ${chunk.chunkIndex} for ${fileName}`);
+        // Only the first response carries information we use (actualFilename)
+        const parseResponse = !serverFilename;
+        const response = await this.uploadChunk(serverUrl, loaded.data, chunk.chunkIndex, fileName, apiKey, parseResponse, loaded.encoding);
+
+        // Capture server-determined filename from first chunk response
+        if (response.data && response.data.actualFilename && !serverFilename) {
+          serverFilename = response.data.actualFilename;
+        }
+        
+        uploadedIds.push(chunk.id);
+        if (uploadedIds.length >= DELETE_BATCH_MAX_RECORDS) {
+          await pendingDelete;
+          pendingDelete = this._deleteChunks(db, uploadedIds);
+          pendingDelete.catch(() => {});
+          uploadedIds = [];
+        }
+      }
+    } finally {
+      await pendingDelete;
+      if (uploadedIds.length > 0) {
+        await this._deleteChunks(db, uploadedIds);
       }
-      
-      await db.delete(this.storeName, chunk.id);
     }
     
     // Store the mapping of client filename to server filename
-    serverFilename = serverFilename || require('path').basename(fileName);
+    serverFilename = serverFilename || path.basename(fileName);
     
-    if (serverFilename !== require('path').basename(fileName)) {
+    if (serverFilename !== path.basename(fileName)) {
       this.logger.info(`Upload complete for ${fileName} -> Server saved as: ${serverFilename}`);
     } else {
       this.logger.info(`Upload complete for ${fileName}`);
@@ -580,9 +988,9 @@ class IndexedCPClient {
     const apiKey = await this.getApiKey();
     const db = await this.initDB();
     
-    // Get all pending packets grouped by session
-    const packets = await db.getAll('packets');
-    const pendingPackets = packets.filter(p => p.status === 'pending');
+    // Get all pending packets grouped by session. Selected by status so
+    // payloads of already uploaded packets are never read from disk.
+    const pendingPackets = await db.getAllFromIndex('packets', 'status', 'pending');
     
     this.logger.info(`Found ${pendingPackets.length} encrypted packets to upload`);
     
@@ -600,13 +1008,11 @@ class IndexedCPClient {
       sessionGroups[packet.sessionId].push(packet);
     });
     
-    // Upload all sessions in parallel (non-blocking)
-    const uploadPromises = Object.entries(sessionGroups).map(([sessionId, sessionPackets]) =>
+    // Upload sessions in parallel, at most uploadConcurrency at a time
+    const results = await mapWithConcurrency(Object.entries(sessionGroups), this.uploadConcurrency, ([sessionId, sessionPackets]) =>
       this.uploadSession(serverUrl, sessionId, sessionPackets, db, apiKey)
     );
     
-    const results = await Promise.all(uploadPromises);
-    
     // Combine results
     const uploadResults = {};
     results.forEach(result => {
@@ -648,13 +1054,11 @@ class IndexedCPClient {
         serverFilename = result.actualFilename;
       }
       
-      // Mark packets as uploaded
-      const tx = db.transaction('packets', 'readwrite');
+      // Mark packets as uploaded, one store write per batch
       for (const packet of batch) {
         packet.status = 'uploaded';
-        await tx.objectStore('packets').put(packet);
       }
-      await tx.done;
+      await db.putMany('packets', batch.map(withoutPayload));
     }
     
     this.logger.info(`✓ Upload complete: ${session.fileName}`);
@@ -662,6 +1066,7 @@ class IndexedCPClient {
     // Clean up session state
     this.sessionKeys.delete(sessionId);
     this.sessionSeqCounters.delete(sessionId);
+    this.sessionBinaryAAD.delete(sessionId);
     
     return {
       fileName: session.fileName,
@@ -710,17 +1115,15 @@ class IndexedCPClient {
       const payload = {
         sessionId: packet.sessionId,
         kid: session.kid,
-        wrappedKey: Buffer.from(session.wrappedKey).toString('base64'),
-        ciphertext: Buffer.from(packet.ciphertext).toString('base64'),
-        iv: Buffer.from(packet.iv).toString('base64'),
-        authTag: Buffer.from(packet.authTag).toString('base64'),
-        aad: Buffer.from(packet.aad).toString('base64'),
+        wrappedKey: asBuffer(session.wrappedKey).toString('base64'),
+        ...this.cryptoUtils.serializePacket(packet),
         seq: packet.seq,
         fileName: session.fileName
       };
       
       const response = await fetch(`${serverUrl}/upload-encrypted`, {
         method: 'POST',
+        agent: selectAgent,
         headers: {
           'Content-Type': 'application/json',
           'Authorization': `Bearer ${apiKey}`
@@ -738,19 +1141,17 @@ class IndexedCPClient {
       const payload = {
         sessionId: packets[0].sessionId,
         kid: session.kid,
-        wrappedKey: Buffer.from(session.wrappedKey).toString('base64'),
+        wrappedKey: asBuffer(session.wrappedKey).toString('base64'),
         fileName: session.fileName,
         packets: packets.map(packet => ({
-          ciphertext: Buffer.from(packet.ciphertext).toString('base64'),
-          iv: Buffer.from(packet.iv).toString('base64'),
-          authTag: Buffer.from(packet.authTag).toString('base64'),
-          aad: Buffer.from(packet.aad).toString('base64'),
+          ...this.cryptoUtils.serializePacket(packet),
           seq: packet.seq
         }))
       };
       
       const response = await fetch(`${serverUrl}/upload-encrypted-batch`, {
         method: 'POST',
+        agent: selectAgent,
         headers: {
           'Content-Type': 'application/json',
           'Authorization': `Bearer ${apiKey}`
@@ -766,29 +1167,64 @@ class IndexedCPClient {
     }
   }
 
-  async uploadChunk(serverUrl, chunk, index, fileName, apiKey) {
+  /**
+   * Upload a single chunk
+   * @param {string} serverUrl - Upload endpoint
+   * @param {Buffer|Uint8Array|stream.Readable} chunk - Chunk payload (a stream is sent as-is)
+   * @param {number} index - Chunk index within the file
+   * @param {string} fileName - Client file name
+   * @param {string} [apiKey] - API key (prompted for if omitted)
+   * @param {boolean} [parseResponse=true] - Parse the response body into response.data.
+   *   When false the body is drained without decoding and response.data is null.
+   * @param {string} [encoding] - Content-Encoding of an already compressed chunk ('gzip' or 'zstd')
+   * @returns {Promise<Response>}
+   */
+  async uploadChunk(serverUrl, chunk, index, fileName, apiKey, parseResponse = true, encoding = null) {
     if (!apiKey) {
       apiKey = await this.getApiKey();
     }
     
+    const headers = {
+      'Content-Type': 'application/octet-stream',
+      'X-Chunk-Index': index.toString(),
+      'X-File-Name': fileName,
+      'Authorization': `Bearer ${apiKey}`
+    };
+    if (encoding) {
+      headers['Content-Encoding'] = encoding;
+    }
+    if (!parseResponse) {
+      // Let the server answer with an empty 204 instead of a JSON body
+      headers['Prefer'] = 'return=minimal';
+    }
+    
     const response = await fetch(serverUrl, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/octet-stream',
-        'X-Chunk-Index': index.toString(),
-        'X-File-Name': fileName,
-        'Authorization': `Bearer ${apiKey}`
-      },
-      body: chunk
+      agent: selectAgent,
+      headers,
+      body: typeof chunk.pipe === 'function' ? chunk : asBuffer(chunk)
     });
     
     if (!response.ok) {
       if (response.status === 401) {
         throw new Error('Authentication failed: Invalid API key');
       }
+      if (response.status === 409) {
+        // The server lost the upload session (evicted or restarted) after
+        // earlier chunks were sent and deleted; this chunk cannot be placed
+        throw permanentError(`Upload failed: ${response.statusText} (upload session for ${fileName} expired)`);
+      }
       throw new Error(`Upload failed: ${response.statusText}`);
     }
-    
+
+    if (!parseResponse) {
+      // Drain any body (servers may ignore Prefer) so the connection can be
+      // reused, but skip decoding/parsing
+      await response.arrayBuffer();
+      response.data = null;
+      return response;
+    }
+
     // Try to parse response as JSON (new format) or fall back to text (backward compatibility)
     let responseData = null;
     const contentType = response.headers.get('content-type');
@@ -798,7 +1234,7 @@ class IndexedCPClient {
         responseData = await response.json();
         
         // Log server-determined filename if it differs from client filename
-        if (responseData.actualFilename && responseData.actualFilename !== fileName && responseData.actualFilename !== require('path').basename(fileName)) {
+        if (responseData.actualFilename && responseData.actualFilename !== fileName && responseData.actualFilename !== path.basename(fileName)) {
           this.logger.info(`Server used filename: ${responseData.actualFilename} (client sent: ${fileName})`);
         }
       } else {
@@ -816,41 +1252,121 @@ class IndexedCPClient {
     return response;
   }
 
-  async bufferAndUpload(filePath, serverUrl) {
-    const apiKey = await this.getApiKey();
-    const db = await this.initDB();
-
-    return new Promise((resolve, reject) => {
-      const readStream = fs.createReadStream(filePath, { highWaterMark: 1024 * 1024 }); // 1MB chunks
-      let chunkIndex = 0;
+  /**
+   * Delete uploaded chunks together with their retry state in one transaction
+   * @private
+   */
+  async _deleteChunks(db, ids) {
+    const tx = db.transaction([this.storeName, 'retries'], 'readwrite');
+    const chunkStore = tx.objectStore(this.storeName);
+    const retryStore = tx.objectStore('retries');
+    for (const id of ids) {
+      chunkStore.delete(id);
+      retryStore.delete(id);
+    }
+    await tx.done;
+  }
 
-      readStream.on('data', async (chunk) => {
-        try {
-          await db.add(this.storeName, { id: chunkIndex, data: chunk });
-          chunkIndex++;
-        } catch (error) {
-          reject(error);
+  /**
+   * Get the bytes for a chunk record, re-reading descriptor records
+   * (data: null) from their source file
+   * @private
+   */
+  async _readChunkData(chunk) {
+    if (chunk.data) {
+      return chunk.data;
+    }
+    
+    // Descriptors buffered by older versions only have the client file name.
+    // A missing, changed or truncated source never recovers, so those errors
+    // are permanent rather than retried.
+    const sourcePath = chunk.sourcePath || chunk.fileName;
+    let handle;
+    try {
+      handle = await fs.promises.open(sourcePath, 'r');
+    } catch (error) {
+      if (error.code === 'ENOENT') {
+        throw permanentError(`Source file ${sourcePath} of chunk ${chunk.chunkIndex} no longer exists`);
+      }
+      throw error;
+    }
+    try {
+      if (chunk.sourceSize != null) {
+        const stats = await handle.stat();
+        if (stats.size !== chunk.sourceSize || stats.mtimeMs !== chunk.sourceMtime) {
+          throw permanentError(`Source file ${sourcePath} changed since chunk ${chunk.chunkIndex} was buffered`);
         }
-      });
+      }
+      const buffer = Buffer.allocUnsafe(chunk.length);
+      const { bytesRead } = await handle.read(buffer, 0, chunk.length, chunk.offset);
+      if (bytesRead !== chunk.length) {
+        throw permanentError(`Short read of ${sourcePath} for chunk ${chunk.chunkIndex}: ${bytesRead} of ${chunk.length} bytes`);
+      }
+      return buffer;
+    } finally {
+      await handle.close();
+    }
+  }
 
-      readStream.on('end', async () => {
-        try {
-          for (let i = 0; i < chunkIndex; i++) {
-            const record = await db.get(this.storeName, i);
-            if (record) {
-              await this.uploadChunk(serverUrl, record.data, i, filePath, apiKey);
-              await db.delete(this.storeName, i);
-            }
-          }
-          this.logger.info('Upload complete.');
-          resolve();
-        } catch (error) {
-          reject(error);
+  /**
+   * Upload a file directly, buffering only what could not be sent.
+   * Chunks are streamed straight from the file to the server; the store is only
+   * touched if an upload fails, and then only with descriptors (offset/length)
+   * for the failed and remaining chunks, which the next upload pass re-reads
+   * from the file. With `compression` set, each chunk is read and compressed
+   * before it is sent, as addFile() does; re-read descriptors are sent raw.
+   * @param {string} filePath - File to upload
+   * @param {string} serverUrl - Upload endpoint
+   */
+  async bufferAndUpload(filePath, serverUrl) {
+    const apiKey = await this.getApiKey();
+    const chunkSize = await this._chunkSizeFor(filePath);
+    const { size, mtimeMs } = await fs.promises.stat(filePath);
+    const chunkCount = Math.ceil(size / chunkSize);
+    let chunkIndex = 0;
+    // Compressed chunks have to be read whole; only then is a handle needed
+    const handle = this.compression ? await fs.promises.open(filePath, 'r') : null;
+    
+    try {
+      // Without compression each chunk is piped from the file into the
+      // request as a byte-range stream, so no chunk-sized buffer is
+      // allocated or copied
+      for (; chunkIndex < chunkCount; chunkIndex++) {
+        const start = chunkIndex * chunkSize;
+        const end = Math.min(start + chunkSize, size) - 1;
+        if (handle) {
+          const chunk = Buffer.allocUnsafe(end - start + 1);
+          const { bytesRead } = await handle.read(chunk, 0, chunk.length, start);
+          const data = chunk.subarray(0, bytesRead);
+          const compressed = compressChunk(data, this.compression);
+          await this.uploadChunk(serverUrl, compressed || data, chunkIndex, filePath, apiKey, false, compressed ? this.compression : null);
+        } else {
+          const body = fs.createReadStream(filePath, { start, end });
+          await this.uploadChunk(serverUrl, body, chunkIndex, filePath, apiKey, false);
         }
-      });
-
-      readStream.on('error', reject);
-    });
+      }
+    } catch (error) {
+      if (chunkIndex < chunkCount) {
+        const db = await this.initDB();
+        const tx = db.transaction(this.storeName, 'readwrite');
+        const store = tx.objectStore(this.storeName);
+        // Re-read later, possibly from another working directory
+        const source = { path: path.resolve(filePath), size, mtimeMs };
+        for (let i = chunkIndex; i < chunkCount; i++) {
+          const offset = i * chunkSize;
+          store.put(createChunkRecord(filePath, i, null, null, offset, Math.min(chunkSize, size - offset), source));
+        }
+        await tx.done;
+        this.logger.warn(`Upload of ${filePath} failed at chunk ${chunkIndex}; ${chunkCount - chunkIndex} chunk(s) buffered for retry`);
+      }
+      throw error;
+    } finally {
+      if (handle) {
+        await handle.close();
+      }
+    }
+    
+    this.logger.info('Upload complete.');
   }
 
   // ============================================================================
@@ -945,40 +1461,53 @@ class IndexedCPClient {
    */
   async _processUnencryptedBackgroundUpload(serverUrl, db, now) {
     const apiKey = await this.getApiKey();
-    const allRecords = await db.getAll(this.storeName);
     
-    if (allRecords.length === 0) {
+    // Only keys and retry state are read here; payloads are loaded one
+    // chunk at a time when they are actually uploaded.
+    // A retry scheduled further out than maxRetryDelay was scheduled before
+    // the wall clock stepped backwards; it is due rather than waiting.
+    const latestRetry = now + this.maxRetryDelay;
+    // Chunks that failed permanently have retryCount = maxRetries, so they
+    // are exhausted even when maxRetries is Infinity
+    const [chunkKeys, waitingIds, exhaustedRetries, dueRetries, skewedRetries] = await Promise.all([
+      this._getChunkKeys(db),
+      db.getAllKeysFromIndex('retries', 'byNextRetry', IDBKeyRange.bound(now, latestRetry, true, false)),
+      db.getAllFromIndex('retries', 'byRetryCount', IDBKeyRange.lowerBound(this.maxRetries)),
+      db.getAllFromIndex('retries', 'byNextRetry', IDBKeyRange.upperBound(now)),
+      db.getAllFromIndex('retries', 'byNextRetry', IDBKeyRange.lowerBound(latestRetry, true))
+    ]);
+    
+    if (chunkKeys.length === 0) {
       return; // Nothing to upload
     }
     
-    // Group by fileName
+    const waiting = new Set(waitingIds);
+    const exhausted = new Map(exhaustedRetries.map(entry => [entry.id, entry]));
+    const retriesById = new Map([...dueRetries, ...skewedRetries].map(entry => [entry.id, entry]));
+    
+    // Group by fileName (keys arrive in fileName, chunkIndex order)
     const fileGroups = {};
-    allRecords.forEach(record => {
-      // Initialize retry metadata if not present
-      if (!record.retryMetadata) {
-        record.retryMetadata = {
-          retryCount: 0,
-          lastAttempt: null,
-          nextRetry: now,
-          errors: []
-        };
-      }
-      
-      // Check if ready for retry
-      if (record.retryMetadata.nextRetry > now) {
+    chunkKeys.forEach(chunk => {
+      if (waiting.has(chunk.id)) {
         return; // Not ready yet
       }
       
-      // Check max retries
-      if (record.retryMetadata.retryCount >= this.maxRetries) {
-        this.logger.warn(`⚠ Max retries (${this.maxRetries}) reached for chunk ${record.id}`);
+      // Check max retries; permanent failures were logged when they happened
+      const exhaustedEntry = exhausted.get(chunk.id);
+      if (exhaustedEntry) {
+        if (!exhaustedEntry.permanent) {
+          this.logger.warn(`⚠ Max retries (${this.maxRetries}) reached for chunk ${chunk.id}`);
+        }
         return;
       }
       
-      if (!fileGroups[record.fileName]) {
-        fileGroups[record.fileName] = [];
+      // Chunks that never failed have no retry state
+      chunk.retryMetadata = retriesById.get(chunk.id) || null;
+      
+      if (!fileGroups[chunk.fileName]) {
+        fileGroups[chunk.fileName] = [];
       }
-      fileGroups[record.fileName].push(record);
+      fileGroups[chunk.fileName].push(chunk);
     });
     
     const fileCount = Object.keys(fileGroups).length;
@@ -988,90 +1517,205 @@ class IndexedCPClient {
     
     this.logger.info(`📤 Background upload: ${fileCount} file(s) with pending chunks`);
     
-    // Upload files in parallel
-    const uploadPromises = Object.entries(fileGroups).map(([fileName, chunks]) =>
-      this._uploadFileChunksWithRetry(serverUrl, fileName, chunks, db, apiKey, now)
+    // Upload files in parallel, at most uploadConcurrency at a time. Retry
+    // state for failed chunks is collected and written once for the pass.
+    const failedRetries = [];
+    const results = await settleWithConcurrency(Object.entries(fileGroups), this.uploadConcurrency, ([fileName, chunks]) =>
+      this._uploadFileChunksWithRetry(serverUrl, fileName, chunks, db, apiKey, now, failedRetries)
     );
-    
-    const results = await Promise.allSettled(uploadPromises);
+    if (failedRetries.length > 0) {
+      await this._putRetries(db, failedRetries);
+    }
     
     // Report results
     const succeeded = results.filter(r => r.status === 'fulfilled').length;
     const failed = results.filter(r => r.status === 'rejected').length;
     
+    if (succeeded > 0) {
+      checkpointSqliteWal(this.logger);
+    }
     if (succeeded > 0 && this.onUploadComplete) {
       this.onUploadComplete({ succeeded, failed, total: results.length });
     }
   }
 
   /**
-   * Upload file chunks with retry metadata tracking
+   * Backoff before the given retry, in whole milliseconds
    * @private
    */
-  async _uploadFileChunksWithRetry(serverUrl, fileName, chunks, db, apiKey, now) {
-    // Sort chunks by index
-    chunks.sort((a, b) => a.chunkIndex - b.chunkIndex);
-    
+  _retryDelay(retryCount) {
+    return this.backoffTable[Math.min(retryCount, this.backoffTable.length) - 1];
+  }
+
+  /**
+   * Whether a failed upload is still waiting out its backoff at `now`.
+   * nextRetry is wall-clock time, so a retry more than maxRetryDelay away
+   * was scheduled before the clock stepped backwards and is treated as due.
+   * @private
+   */
+  _isRetryWaiting(retryMetadata, now) {
+    return retryMetadata.nextRetry > now &&
+      retryMetadata.nextRetry - now <= this.maxRetryDelay;
+  }
+
+  /**
+   * List buffered chunks as { id, fileName, chunkIndex } without loading payloads
+   * @private
+   */
+  async _getChunkKeys(db) {
+    const keys = [];
+    let cursor = await db.transaction(this.storeName).store.index('byFile').openKeyCursor();
+    while (cursor) {
+      const [fileName, chunkIndex] = cursor.key;
+      keys.push({ id: cursor.primaryKey, fileName, chunkIndex });
+      cursor = await cursor.continue();
+    }
+    return keys;
+  }
+
+  /**
+   * Read one buffered chunk's payload and encoding, or null if it is gone
+   * @private
+   */
+  async _loadChunk(db, id) {
+    const record = await db.get(this.storeName, id);
+    if (!record) {
+      return null;
+    }
+    return { data: await this._readChunkData(record), encoding: record.encoding };
+  }
+
+  /**
+   * Write retry state for several chunks in one transaction
+   * @private
+   */
+  async _putRetries(db, retryEntries) {
+    const tx = db.transaction('retries', 'readwrite');
+    const store = tx.objectStore('retries');
+    for (const entry of retryEntries) {
+      store.put(entry);
+    }
+    await tx.done;
+  }
+
+  /**
+   * Upload file chunks with retry metadata tracking.
+   * Updated retry state of failed chunks is appended to `failedRetries`
+   * for the caller to persist.
+   * @private
+   */
+  async _uploadFileChunksWithRetry(serverUrl, fileName, chunks, db, apiKey, now, failedRetries) {
+    // Chunks arrive in chunkIndex order from the byFile index
     const errors = [];
     let successCount = 0;
+    let uploadedIds = [];
     
-    for (const chunk of chunks) {
-      try {
-        // Update retry metadata
-        chunk.retryMetadata.lastAttempt = now;
-        chunk.retryMetadata.retryCount++;
-        
-        // Attempt upload
-        const response = await this.uploadChunk(serverUrl, chunk.data, chunk.chunkIndex, fileName, apiKey);
-        
-        // Success - delete from DB
-        await db.delete(this.storeName, chunk.id);
-        successCount++;
-        
-        if (this.onUploadProgress) {
-          this.onUploadProgress({
-            fileName,
-            chunkIndex: chunk.chunkIndex,
-            status: 'success',
-            retryCount: chunk.retryMetadata.retryCount - 1
-          });
+    try {
+      for (const chunk of chunks) {
+        const record = await db.get(this.storeName, chunk.id);
+        if (!record) {
+          continue; // Uploaded and removed since the keys were read
         }
-      } catch (error) {
-        // Failure - update retry metadata with exponential backoff
-        const delay = Math.min(
-          this.initialRetryDelay * Math.pow(this.retryMultiplier, chunk.retryMetadata.retryCount - 1),
-          this.maxRetryDelay
-        );
         
-        chunk.retryMetadata.nextRetry = now + delay;
-        chunk.retryMetadata.errors.push({
-          timestamp: now,
-          message: error.message
-        });
-        
-        // Keep only last 5 errors
-        if (chunk.retryMetadata.errors.length > 5) {
-          chunk.retryMetadata.errors.shift();
+        // Chunks buffered by older versions may still carry retry state inline
+        if (!chunk.retryMetadata && record.retryMetadata) {
+          chunk.retryMetadata = { ...record.retryMetadata, id: chunk.id };
+          if (this._isRetryWaiting(chunk.retryMetadata, now)) {
+            continue; // Not ready yet
+          }
+          if (chunk.retryMetadata.retryCount >= this.maxRetries) {
+            this.logger.warn(`⚠ Max retries (${this.maxRetries}) reached for chunk ${chunk.id}`);
+            continue;
+          }
         }
         
-        // Update chunk in DB with new retry metadata
-        await db.put(this.storeName, chunk);
-        
-        errors.push(error);
+        // Failed attempts so far; retry metadata only exists after a failure
+        const previousAttempts = chunk.retryMetadata ? chunk.retryMetadata.retryCount : 0;
         
-        this.logger.warn(`⚠ Upload failed for ${fileName} chunk ${chunk.chunkIndex} (retry ${chunk.retryMetadata.retryCount}/${this.maxRetries === Infinity ? '∞' : this.maxRetries}). Next retry in ${Math.round(delay/1000)}s`);
-        
-        if (this.onUploadProgress) {
-          this.onUploadProgress({
-            fileName,
-            chunkIndex: chunk.chunkIndex,
-            status: 'failed',
-            retryCount: chunk.retryMetadata.retryCount,
-            nextRetryIn: delay,
-            error: error.message
+        try {
+          // Attempt upload
+          const data = await this._readChunkData(record);
+          await this.uploadChunk(serverUrl, data, chunk.chunkIndex, fileName, apiKey, false, record.encoding);
+          
+          // Success - chunk and its retry state are deleted in batches
+          uploadedIds.push(chunk.id);
+          if (uploadedIds.length >= DELETE_BATCH_MAX_RECORDS) {
+            await this._deleteChunks(db, uploadedIds);
+            uploadedIds = [];
+          }
+          successCount++;
+          
+          if (this.onUploadProgress) {
+            this.onUploadProgress({
+              fileName,
+              chunkIndex: chunk.chunkIndex,
+              status: 'success',
+              retryCount: previousAttempts
+            });
+          }
+        } catch (error) {
+          // Failure - create/update retry metadata with exponential backoff
+          chunk.retryMetadata = chunk.retryMetadata || createRetryMetadata(chunk.id);
+          chunk.retryMetadata.lastAttempt = now;
+          chunk.retryMetadata.errors.push({
+            timestamp: now,
+            message: error.message
           });
+          
+          // Keep only last 5 errors
+          if (chunk.retryMetadata.errors.length > 5) {
+            chunk.retryMetadata.errors.shift();
+          }
+          
+          // Only the retry state is persisted; the chunk payload is not rewritten
+          failedRetries.push(chunk.retryMetadata);
+          
+          errors.push(error);
+          
+          if (error.permanent) {
+            // Retrying cannot succeed: mark the chunk as out of retries so
+            // later passes skip it. It stays buffered and shows in `ls`.
+            chunk.retryMetadata.retryCount = this.maxRetries;
+            chunk.retryMetadata.nextRetry = now;
+            chunk.retryMetadata.permanent = true;
+            
+            this.logger.error(`✗ Upload failed permanently for ${fileName} chunk ${chunk.chunkIndex}: ${error.message}. Not retrying`);
+            
+            if (this.onUploadProgress) {
+              this.onUploadProgress({
+                fileName,
+                chunkIndex: chunk.chunkIndex,
+                status: 'failed',
+                permanent: true,
+                retryCount: previousAttempts + 1,
+                error: error.message
+              });
+            }
+            continue;
+          }
+          
+          chunk.retryMetadata.retryCount = previousAttempts + 1;
+          const delay = this._retryDelay(chunk.retryMetadata.retryCount);
+          chunk.retryMetadata.nextRetry = now + delay;
+          
+          this.logger.warn(`⚠ Upload failed for ${fileName} chunk ${chunk.chunkIndex} (retry ${chunk.retryMetadata.retryCount}/${this.maxRetries === Infinity ? '∞' : this.maxRetries}). Next retry in ${Math.round(delay/1000)}s`);
+          
+          if (this.onUploadProgress) {
+            this.onUploadProgress({
+              fileName,
+              chunkIndex: chunk.chunkIndex,
+              status: 'failed',
+              retryCount: chunk.retryMetadata.retryCount,
+              nextRetryIn: delay,
+              error: error.message
+            });
+          }
         }
       }
+    } finally {
+      if (uploadedIds.length > 0) {
+        await this._deleteChunks(db, uploadedIds);
+      }
     }
     
     if (errors.length > 0) {
@@ -1087,26 +1731,21 @@ class IndexedCPClient {
    */
   async _processEncryptedBackgroundUpload(serverUrl, db, now) {
     const apiKey = await this.getApiKey();
-    const packets = await db.getAll('packets');
+    // Selected by status so payloads of uploaded packets are never read
+    const packets = (await Promise.all([
+      db.getAllFromIndex('packets', 'status', 'pending'),
+      db.getAllFromIndex('packets', 'status', 'failed')
+    ])).flat();
     
     // Filter for pending packets ready for retry
     const retryablePackets = packets.filter(packet => {
-      if (packet.status !== 'pending' && packet.status !== 'failed') {
-        return false;
-      }
-      
-      // Initialize retry metadata if not present
+      // Packets that never failed have no retry metadata
       if (!packet.retryMetadata) {
-        packet.retryMetadata = {
-          retryCount: 0,
-          lastAttempt: null,
-          nextRetry: now,
-          errors: []
-        };
+        return true;
       }
       
       // Check if ready for retry
-      if (packet.retryMetadata.nextRetry > now) {
+      if (this._isRetryWaiting(packet.retryMetadata, now)) {
         return false;
       }
       
@@ -1134,12 +1773,15 @@ class IndexedCPClient {
     
     this.logger.info(`📤 Background upload: ${Object.keys(sessionGroups).length} session(s) with ${retryablePackets.length} pending packets`);
     
-    // Upload sessions in parallel
-    const uploadPromises = Object.entries(sessionGroups).map(([sessionId, sessionPackets]) =>
-      this._uploadSessionWithRetry(serverUrl, sessionId, sessionPackets, db, apiKey, now)
+    // Upload sessions in parallel, at most uploadConcurrency at a time.
+    // Failed packets are collected and written once for the pass.
+    const failedPackets = [];
+    const results = await settleWithConcurrency(Object.entries(sessionGroups), this.uploadConcurrency, ([sessionId, sessionPackets]) =>
+      this._uploadSessionWithRetry(serverUrl, sessionId, sessionPackets, db, apiKey, now, failedPackets)
     );
-    
-    const results = await Promise.allSettled(uploadPromises);
+    if (failedPackets.length > 0) {
+      await db.putMany('packets', failedPackets.map(withoutPayload));
+    }
     
     // Report results
     const succeeded = results.filter(r => r.status === 'fulfilled').length;
@@ -1151,10 +1793,12 @@ class IndexedCPClient {
   }
 
   /**
-   * Upload session with retry metadata tracking
+   * Upload session with retry metadata tracking.
+   * Failed packets, with updated retry metadata, are appended to
+   * `failedPackets` for the caller to persist.
    * @private
    */
-  async _uploadSessionWithRetry(serverUrl, sessionId, sessionPackets, db, apiKey, now) {
+  async _uploadSessionWithRetry(serverUrl, sessionId, sessionPackets, db, apiKey, now, failedPackets) {
     // Get session metadata
     const session = await db.get('sessions', sessionId);
     if (!session) {
@@ -1167,99 +1811,111 @@ class IndexedCPClient {
     
     const errors = [];
     let successCount = 0;
+    let uploadedPackets = [];
+    // Same for every packet of the session; encode once
+    const wrappedKey = asBuffer(session.wrappedKey).toString('base64');
     
-    for (const packet of sessionPackets) {
-      try {
-        // Update retry metadata
-        packet.retryMetadata.lastAttempt = now;
-        packet.retryMetadata.retryCount++;
-        
-        // Attempt upload
-        const payload = {
-          sessionId: packet.sessionId,
-          kid: session.kid,
-          wrappedKey: Buffer.from(session.wrappedKey).toString('base64'),
-          ciphertext: Buffer.from(packet.ciphertext).toString('base64'),
-          iv: Buffer.from(packet.iv).toString('base64'),
-          authTag: Buffer.from(packet.authTag).toString('base64'),
-          aad: Buffer.from(packet.aad).toString('base64'),
-          seq: packet.seq,
-          fileName: session.fileName
-        };
-        
-        const response = await fetch(`${serverUrl}/upload-encrypted`, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${apiKey}`
-          },
-          body: JSON.stringify(payload)
-        });
-        
-        if (!response.ok) {
-          throw new Error(`Upload failed: ${response.statusText}`);
-        }
-        
-        // Success - mark as uploaded
-        packet.status = 'uploaded';
-        delete packet.retryMetadata; // Clean up metadata
-        await db.put('packets', packet);
-        successCount++;
+    try {
+      for (const packet of sessionPackets) {
+        // Failed attempts so far; retry metadata only exists after a failure
+        const previousAttempts = packet.retryMetadata ? packet.retryMetadata.retryCount : 0;
         
-        if (this.onUploadProgress) {
-          this.onUploadProgress({
-            sessionId,
-            fileName: session.fileName,
+        try {
+          // Attempt upload
+          const payload = {
+            sessionId: packet.sessionId,
+            kid: session.kid,
+            wrappedKey,
+            ...this.cryptoUtils.serializePacket(packet),
             seq: packet.seq,
-            status: 'success',
-            retryCount: packet.retryMetadata.retryCount - 1
+            fileName: session.fileName
+          };
+          
+          const response = await fetch(`${serverUrl}/upload-encrypted`, {
+            method: 'POST',
+            agent: selectAgent,
+            headers: {
+              'Content-Type': 'application/json',
+              'Authorization': `Bearer ${apiKey}`
+            },
+            body: JSON.stringify(payload)
           });
-        }
-      } catch (error) {
-        // Failure - update retry metadata with exponential backoff
-        const delay = Math.min(
-          this.initialRetryDelay * Math.pow(this.retryMultiplier, packet.retryMetadata.retryCount - 1),
-          this.maxRetryDelay
-        );
-        
-        packet.retryMetadata.nextRetry = now + delay;
-        packet.retryMetadata.errors.push({
-          timestamp: now,
-          message: error.message
-        });
-        
-        // Keep only last 5 errors
-        if (packet.retryMetadata.errors.length > 5) {
-          packet.retryMetadata.errors.shift();
-        }
-        
-        packet.status = 'failed';
-        
-        // Update packet in DB with new retry metadata
-        await db.put('packets', packet);
-        
-        errors.push(error);
-        
-        this.logger.warn(`⚠ Upload failed for ${session.fileName} packet ${packet.seq} (retry ${packet.retryMetadata.retryCount}/${this.maxRetries === Infinity ? '∞' : this.maxRetries}). Next retry in ${Math.round(delay/1000)}s`);
-        
-        if (this.onUploadProgress) {
-          this.onUploadProgress({
-            sessionId,
-            fileName: session.fileName,
-            seq: packet.seq,
-            status: 'failed',
-            retryCount: packet.retryMetadata.retryCount,
-            nextRetryIn: delay,
-            error: error.message
+          
+          if (!response.ok) {
+            throw new Error(`Upload failed: ${response.statusText}`);
+          }
+          
+          // Success - mark as uploaded; stored in batches
+          packet.status = 'uploaded';
+          delete packet.retryMetadata; // Clean up metadata
+          uploadedPackets.push(packet);
+          if (uploadedPackets.length >= DELETE_BATCH_MAX_RECORDS) {
+            await db.putMany('packets', uploadedPackets.map(withoutPayload));
+            uploadedPackets = [];
+          }
+          successCount++;
+          
+          if (this.onUploadProgress) {
+            this.onUploadProgress({
+              sessionId,
+              fileName: session.fileName,
+              seq: packet.seq,
+              status: 'success',
+              retryCount: previousAttempts
+            });
+          }
+        } catch (error) {
+          // Failure - create/update retry metadata with exponential backoff
+          packet.retryMetadata = packet.retryMetadata || createRetryMetadata();
+          packet.retryMetadata.lastAttempt = now;
+          packet.retryMetadata.retryCount = previousAttempts + 1;
+          
+          const delay = this._retryDelay(packet.retryMetadata.retryCount);
+          
+          packet.retryMetadata.nextRetry = now + delay;
+          packet.retryMetadata.errors.push({
+            timestamp: now,
+            message: error.message
           });
+          
+          // Keep only last 5 errors
+          if (packet.retryMetadata.errors.length > 5) {
+            packet.retryMetadata.errors.shift();
+          }
+          
+          packet.status = 'failed';
+          
+          // Stored with its new retry metadata at the end of the pass
+          failedPackets.push(packet);
+          
+          errors.push(error);
+          
+          this.logger.warn(`⚠ Upload failed for ${session.fileName} packet ${packet.seq} (retry ${packet.retryMetadata.retryCount}/${this.maxRetries === Infinity ? '∞' : this.maxRetries}). Next retry in ${Math.round(delay/1000)}s`);
+          
+          if (this.onUploadProgress) {
+            this.onUploadProgress({
+              sessionId,
+              fileName: session.fileName,
+              seq: packet.seq,
+              status: 'failed',
+              retryCount: packet.retryMetadata.retryCount,
+              nextRetryIn: delay,
+              error: error.message
+            });
+          }
         }
       }
+    } finally {
+      if (uploadedPackets.length > 0) {
+        await db.putMany('packets', uploadedPackets.map(withoutPayload));
+      }
     }
     
     // Clean up session state if all packets uploaded
     if (errors.length === 0) {
       this.sessionKeys.delete(sessionId);
       this.sessionSeqCounters.delete(sessionId);
+      this.sessionBinaryAAD.delete(sessionId);
       this.logger.info(`✓ Successfully uploaded ${session.fileName} (${successCount} packets)`);
     } else {
       throw new Error(`${errors.length} packet(s) failed for ${session.fileName}`);
@@ -1,5 +1,72 @@
 const crypto = require('crypto');
 
+/**
+ * Binary AAD layout (36 bytes, fixed offsets):
+ *   0  version (1)    4  sessionId (16, from 32 hex chars)
+ *   1  codec id (1)  20  seq (uint64 LE)
+ *   2  reserved (2)  28  timestamp ms (uint64 LE)
+ * AAD written by older versions is JSON, which always starts with '{'.
+ */
+const AAD_VERSION = 1;
+const AAD_LENGTH = 36;
+const AAD_CODECS = ['raw', 'gzip', 'zstd'];
+// AAD forms parseAAD accepts; servers advertise them in /public-key
+const AAD_FORMATS = ['json', 'binary'];
+// Bytes 0-19 (version, codec, reserved, sessionId) are constant per session
+const AAD_PREFIX_LENGTH = 20;
+const AAD_PREFIX_CACHE_SIZE = 64;
+const SESSION_ID_PATTERN = /^[0-9a-f]{32}$/;
+const KEY_ID_PATTERN = /^[a-f0-9]{16}$/;
+const HEX_PATTERN = /^[a-f0-9]*$/;
+// Random bytes drawn per refill of the IV pool (enough for 341 IVs)
+const IV_POOL_SIZE = 4096;
+// Parsed RSA keys kept per direction; a server rarely has more than a few
+const RSA_KEY_CACHE_SIZE = 8;
+
+/**
+ * Whether a value fits the binary AAD's uint64 fields exactly: a safe,
+ * non-negative integer
+ * @param {*} value
+ * @returns {boolean}
+ */
+function isUint53(value) {
+  return Number.isSafeInteger(value) && value >= 0;
+}
+
+/**
+ * Look up or parse an RSA key, keeping the most recently used
+ * RSA_KEY_CACHE_SIZE KeyObjects in a Map ordered by recency
+ * @param {Map} cache - PEM -> KeyObject
+ * @param {string} pem - Key in PEM format
+ * @param {Function} parse - crypto.createPublicKey or crypto.createPrivateKey
+ * @returns {KeyObject}
+ */
+function cachedRsaKey(cache, pem, parse) {
+  let key = cache.get(pem);
+  if (key) {
+    cache.delete(pem);
+  } else {
+    key = parse(pem);
+    if (cache.size >= RSA_KEY_CACHE_SIZE) {
+      cache.delete(cache.keys().next().value);
+    }
+  }
+  cache.set(pem, key);
+  return key;
+}
+
+/**
+ * Base64-encode a Buffer or any typed-array view (records read back from
+ * IndexedDB hold Uint8Arrays) without copying the bytes first
+ * @param {Buffer|Uint8Array} bytes
+ * @returns {string}
+ */
+function toBase64(bytes) {
+  return Buffer.isBuffer(bytes)
+    ? bytes.toString('base64')
+    : Buffer.from(bytes.buffer, bytes.byteOffset, bytes.byteLength).toString('base64');
+}
+
 /**
  * Cryptographic utilities for asymmetric envelope encryption
  * 
@@ -15,14 +82,66 @@ class CryptoUtils {
     this.AES_KEY_LENGTH = 32; // 256 bits
     this.IV_LENGTH = 12; // 96 bits for GCM
     this.AUTH_TAG_LENGTH = 16; // 128 bits
+    this.AAD_FORMATS = AAD_FORMATS;
+    
+    // KeyObjects for raw session keys, keyed by the key Buffer itself, so a
+    // session's packets reuse one imported key. Entries go away with the Buffer.
+    this.secretKeys = new WeakMap();
+
+    // Pre-drawn randomness that IVs are sliced from, so encrypting a packet
+    // does not cost a CSPRNG call each time. A fresh pool replaces a used-up
+    // one; bytes are never handed out twice.
+    this.ivPool = null;
+    this.ivPoolOffset = 0;
+
+    // Parsed RSA keys by PEM, so wrapping/unwrapping session keys does not
+    // re-parse the same server key each time
+    this.publicKeys = new Map();
+    this.privateKeys = new Map();
+
+    // Binary AAD prefixes by `${codec}:${sessionId}`, so per-packet AAD
+    // building only copies the prefix and writes seq and timestamp
+    this.aadPrefixes = new Map();
+  }
+
+  /**
+   * Take the next IV from the pool, refilling it when exhausted
+   * @returns {Buffer} IV_LENGTH random bytes
+   */
+  nextIV() {
+    if (!this.ivPool || this.ivPoolOffset + this.IV_LENGTH > this.ivPool.length) {
+      this.ivPool = crypto.randomBytes(IV_POOL_SIZE);
+      this.ivPoolOffset = 0;
+    }
+    const iv = Buffer.from(this.ivPool.subarray(this.ivPoolOffset, this.ivPoolOffset + this.IV_LENGTH));
+    this.ivPoolOffset += this.IV_LENGTH;
+    return iv;
+  }
+
+  /**
+   * Get the KeyObject for an AES session key
+   * @param {Buffer|KeyObject} sessionKey - Raw key bytes or a KeyObject
+   * @returns {KeyObject}
+   */
+  getSecretKey(sessionKey) {
+    if (sessionKey instanceof crypto.KeyObject) {
+      return sessionKey;
+    }
+    let secretKey = this.secretKeys.get(sessionKey);
+    if (!secretKey) {
+      secretKey = crypto.createSecretKey(sessionKey);
+      this.secretKeys.set(sessionKey, secretKey);
+    }
+    return secretKey;
   }
 
   /**
    * Generate RSA key pair for server
-   * @param {number} modulusLength - Key size in bits (default: 4096)
+   * @param {number} modulusLength - Key size in bits (default: 3072, which
+   *   matches AES-128-level strength and generates several times faster than 4096)
    * @returns {Promise<{publicKey: string, privateKey: string, kid: string}>}
    */
-  async generateServerKeyPair(modulusLength = 4096) {
+  async generateServerKeyPair(modulusLength = 3072) {
     return new Promise((resolve, reject) => {
       crypto.generateKeyPair(
         'rsa',
@@ -41,12 +160,12 @@ class CryptoUtils {
           if (err) {
             reject(err);
           } else {
-            // Generate key ID from public key hash
+            // Key ID: first 8 bytes of the public key's SHA-256, as 16 hex chars
             const kid = crypto
               .createHash('sha256')
               .update(publicKey)
-              .digest('hex')
-              .substring(0, 16);
+              .digest()
+              .toString('hex', 0, 8);
 
             resolve({ publicKey, privateKey, kid });
           }
@@ -70,7 +189,7 @@ class CryptoUtils {
    * @returns {Buffer} Wrapped (encrypted) session key
    */
   wrapSessionKey(sessionKey, publicKeyPem) {
-    const publicKey = crypto.createPublicKey(publicKeyPem);
+    const publicKey = cachedRsaKey(this.publicKeys, publicKeyPem, crypto.createPublicKey);
     
     return crypto.publicEncrypt(
       {
@@ -82,6 +201,16 @@ class CryptoUtils {
     );
   }
 
+  /**
+   * Wrap one AES session key for several recipients
+   * @param {Buffer} sessionKey - AES key to wrap
+   * @param {string[]} publicKeyPems - RSA public keys in PEM format
+   * @returns {Buffer[]} Wrapped session keys, in recipient order
+   */
+  wrapSessionKeys(sessionKey, publicKeyPems) {
+    return publicKeyPems.map(publicKeyPem => this.wrapSessionKey(sessionKey, publicKeyPem));
+  }
+
   /**
    * Unwrap (decrypt) an AES session key with RSA private key
    * @param {Buffer} wrappedKey - Encrypted session key
@@ -89,7 +218,7 @@ class CryptoUtils {
    * @returns {Buffer} Unwrapped AES session key
    */
   unwrapSessionKey(wrappedKey, privateKeyPem) {
-    const privateKey = crypto.createPrivateKey(privateKeyPem);
+    const privateKey = cachedRsaKey(this.privateKeys, privateKeyPem, crypto.createPrivateKey);
     
     return crypto.privateDecrypt(
       {
@@ -104,31 +233,31 @@ class CryptoUtils {
   /**
    * Encrypt data with AES-GCM
    * @param {Buffer} data - Plaintext to encrypt
-   * @param {Buffer} sessionKey - AES session key
+   * @param {Buffer|KeyObject} sessionKey - AES session key
    * @param {Object} metadata - Additional authenticated data (sessionId, seq, etc.)
    * @returns {Object} {ciphertext, iv, authTag, aad}
    */
   encryptPacket(data, sessionKey, metadata) {
     // Generate unique IV for this packet
-    const iv = crypto.randomBytes(this.IV_LENGTH);
+    const iv = this.nextIV();
     
     // Prepare AAD (Additional Authenticated Data)
-    const aad = Buffer.from(JSON.stringify({
-      sessionId: metadata.sessionId,
-      seq: metadata.seq,
-      codec: metadata.codec || 'raw',
-      timestamp: metadata.timestamp || Date.now()
-    }));
+    const aad = this.buildAAD(
+      metadata.sessionId,
+      metadata.seq,
+      metadata.codec || 'raw',
+      metadata.timestamp || Date.now(),
+      metadata.binaryAAD !== false
+    );
 
     // Create cipher
-    const cipher = crypto.createCipheriv('aes-256-gcm', sessionKey, iv);
+    const cipher = crypto.createCipheriv('aes-256-gcm', this.getSecretKey(sessionKey), iv);
     cipher.setAAD(aad);
 
-    // Encrypt
-    const ciphertext = Buffer.concat([
-      cipher.update(data),
-      cipher.final()
-    ]);
+    // Encrypt. GCM is a stream mode: update() returns all of the ciphertext
+    // and final() only computes the tag, so no concat (and copy) is needed.
+    const ciphertext = cipher.update(data);
+    cipher.final();
 
     // Get authentication tag
     const authTag = cipher.getAuthTag();
@@ -144,58 +273,144 @@ class CryptoUtils {
   /**
    * Decrypt data with AES-GCM
    * @param {Buffer} ciphertext - Encrypted data
-   * @param {Buffer} sessionKey - AES session key
+   * @param {Buffer|KeyObject} sessionKey - AES session key
    * @param {Buffer} iv - Initialization vector
    * @param {Buffer} authTag - Authentication tag
    * @param {Buffer} aad - Additional authenticated data
    * @returns {Buffer} Decrypted plaintext
    */
   decryptPacket(ciphertext, sessionKey, iv, authTag, aad) {
-    const decipher = crypto.createDecipheriv('aes-256-gcm', sessionKey, iv);
+    const decipher = crypto.createDecipheriv('aes-256-gcm', this.getSecretKey(sessionKey), iv);
     decipher.setAAD(aad);
     decipher.setAuthTag(authTag);
 
-    return Buffer.concat([
-      decipher.update(ciphertext),
-      decipher.final()
-    ]);
+    // final() verifies the tag and throws on mismatch, so the plaintext from
+    // update() is only returned once it is authenticated
+    const plaintext = decipher.update(ciphertext);
+    decipher.final();
+    return plaintext;
   }
 
   /**
-   * Serialize encrypted packet for storage
+   * Serialize encrypted packet for storage or upload (base64 fields)
    * @param {Object} packet - Encrypted packet data
-   * @returns {Object} Serialized packet suitable for IndexedDB
+   * @returns {Object} Serialized packet suitable for IndexedDB or JSON
    */
   serializePacket(packet) {
     return {
-      ciphertext: packet.ciphertext.toString('base64'),
-      iv: packet.iv.toString('base64'),
-      authTag: packet.authTag.toString('base64'),
-      aad: packet.aad.toString('base64')
+      ciphertext: toBase64(packet.ciphertext),
+      iv: toBase64(packet.iv),
+      authTag: toBase64(packet.authTag),
+      aad: toBase64(packet.aad)
     };
   }
 
   /**
    * Deserialize encrypted packet from storage
    * @param {Object} serialized - Serialized packet from IndexedDB
-   * @returns {Object} Packet with Buffer instances
+   * @returns {Object} Packet whose fields are views into one decoded Buffer
    */
   deserializePacket(serialized) {
-    return {
-      ciphertext: Buffer.from(serialized.ciphertext, 'base64'),
-      iv: Buffer.from(serialized.iv, 'base64'),
-      authTag: Buffer.from(serialized.authTag, 'base64'),
-      aad: Buffer.from(serialized.aad, 'base64')
-    };
+    const fields = ['ciphertext', 'iv', 'authTag', 'aad'];
+    let total = 0;
+    for (const field of fields) {
+      total += Buffer.byteLength(serialized[field], 'base64');
+    }
+    
+    // Decode all fields into a single allocation and hand out views into it
+    const bytes = Buffer.allocUnsafe(total);
+    const packet = {};
+    let offset = 0;
+    for (const field of fields) {
+      const written = bytes.write(serialized[field], offset, 'base64');
+      packet[field] = bytes.subarray(offset, offset + written);
+      offset += written;
+    }
+    return packet;
+  }
+
+  /**
+   * Build AAD in the fixed binary layout. Session IDs that are not 32 hex
+   * characters, codecs without an id, and seq or timestamp values that are
+   * not safe non-negative integers fall back to the JSON form.
+   * @param {string} sessionId - Session identifier
+   * @param {number} seq - Packet sequence number
+   * @param {string} codec - Payload codec
+   * @param {number} timestamp - Milliseconds since the epoch
+   * @param {boolean} [binary=true] - false always builds JSON, for servers
+   *   that do not advertise binary AAD
+   * @returns {Buffer} AAD bytes
+   */
+  buildAAD(sessionId, seq, codec, timestamp, binary = true) {
+    const prefix = binary && isUint53(seq) && isUint53(timestamp) ? this.getAADPrefix(sessionId, codec) : null;
+    if (!prefix) {
+      return Buffer.from(JSON.stringify({ sessionId, seq, codec, timestamp }));
+    }
+    
+    const aad = Buffer.allocUnsafe(AAD_LENGTH);
+    prefix.copy(aad, 0);
+    aad.writeUInt32LE(seq % 0x100000000, 20);
+    aad.writeUInt32LE(Math.floor(seq / 0x100000000), 24);
+    aad.writeUInt32LE(timestamp % 0x100000000, 28);
+    aad.writeUInt32LE(Math.floor(timestamp / 0x100000000), 32);
+    return aad;
+  }
+
+  /**
+   * Get the session-constant first AAD_PREFIX_LENGTH bytes of a binary AAD
+   * @param {string} sessionId - Session identifier
+   * @param {string} codec - Compression codec
+   * @returns {Buffer|null} Prefix, or null if the pair needs JSON AAD
+   */
+  getAADPrefix(sessionId, codec) {
+    const cacheKey = `${codec}:${sessionId}`;
+    let prefix = this.aadPrefixes.get(cacheKey);
+    if (prefix) {
+      return prefix;
+    }
+    
+    const codecId = AAD_CODECS.indexOf(codec);
+    if (codecId < 0 || !SESSION_ID_PATTERN.test(sessionId)) {
+      return null;
+    }
+    prefix = Buffer.alloc(AAD_PREFIX_LENGTH);
+    prefix[0] = AAD_VERSION;
+    prefix[1] = codecId;
+    prefix.write(sessionId, 4, 16, 'hex');
+    
+    if (this.aadPrefixes.size >= AAD_PREFIX_CACHE_SIZE) {
+      this.aadPrefixes.delete(this.aadPrefixes.keys().next().value);
+    }
+    this.aadPrefixes.set(cacheKey, prefix);
+    return prefix;
   }
 
   /**
    * Parse AAD to extract metadata
    * @param {Buffer} aad - Additional authenticated data
    * @returns {Object} Metadata object
+   * @throws {Error} If binary AAD has an unknown codec id or non-zero
+   *   reserved bytes
    */
   parseAAD(aad) {
-    return JSON.parse(aad.toString());
+    if (aad[0] !== AAD_VERSION || aad.length !== AAD_LENGTH) {
+      return JSON.parse(aad.toString());
+    }
+    const codec = AAD_CODECS[aad[1]];
+    if (codec === undefined) {
+      throw new Error(`Unknown AAD codec id: ${aad[1]}`);
+    }
+    if (aad[2] !== 0 || aad[3] !== 0) {
+      throw new Error('Non-zero reserved bytes in AAD');
+    }
+    // Read the uint64 fields as two uint32 halves: plain number arithmetic,
+    // exact below 2^53, with no BigInt allocated per field
+    return {
+      sessionId: aad.toString('hex', 4, 20),
+      seq: aad.readUInt32LE(20) + aad.readUInt32LE(24) * 0x100000000,
+      codec,
+      timestamp: aad.readUInt32LE(28) + aad.readUInt32LE(32) * 0x100000000
+    };
   }
 
   /**
@@ -204,7 +419,22 @@ class CryptoUtils {
    * @returns {boolean}
    */
   isValidKeyId(kid) {
-    return typeof kid === 'string' && /^[a-f0-9]{16}$/.test(kid);
+    return typeof kid === 'string' && kid.length === 16 && KEY_ID_PATTERN.test(kid);
+  }
+
+  /**
+   * Validate many key IDs at once. When every entry is a 16-char string the
+   * whole batch is checked with a single regex pass over the joined IDs;
+   * otherwise each ID is checked individually.
+   * @param {string[]} kids - Key IDs to validate
+   * @returns {boolean[]} Validity of each key ID, in order
+   */
+  isValidKeyIds(kids) {
+    if (kids.every(kid => typeof kid === 'string' && kid.length === 16) &&
+        HEX_PATTERN.test(kids.join(''))) {
+      return new Array(kids.length).fill(true);
+    }
+    return kids.map(kid => this.isValidKeyId(kid));
   }
 
   /**
@@ -5,6 +5,120 @@ const { createLogger } = require('./logger');
 
 const logger = createLogger({ prefix: '[EncryptedDB]' });
 
+const STORE_NAMES = ['sessions', 'packets', 'keyCache'];
+
+// Primary key field of each store
+const KEY_PATHS = new Map([['sessions', 'sessionId'], ['packets', 'id'], ['keyCache', 'kid']]);
+
+// Large binary fields kept out of the JSON store, one file per record, so
+// loading and saving a store never parses or re-encodes payload bytes
+const PAYLOAD_FIELDS = { packets: 'ciphertext' };
+
+// Payload files are read or removed this many at a time
+const PAYLOAD_IO_CONCURRENCY = 64;
+
+// Matches Buffers written in JSON.stringify's default form
+const LEGACY_BUFFER_PATTERN = /"type":\s*"Buffer",\s*"data":\s*\[/;
+
+// Distinguishes temp files of concurrent writes from this process
+let tmpFileCounter = 0;
+
+/**
+ * Write a file to a temp file, fsync it and rename it into place, so a
+ * crash leaves either the old or the new contents, never a truncated file
+ */
+async function writeFileAtomic(filePath, data) {
+  const tmpFile = `${filePath}.${process.pid}.${++tmpFileCounter}.tmp`;
+  try {
+    const handle = await fs.promises.open(tmpFile, 'w');
+    try {
+      await handle.writeFile(data);
+      await handle.sync();
+    } finally {
+      await handle.close();
+    }
+    await fs.promises.rename(tmpFile, filePath);
+  } catch (error) {
+    await fs.promises.rm(tmpFile, { force: true });
+    throw error;
+  }
+}
+
+/**
+ * Copy a value for JSON with binary fields as base64 instead of
+ * JSON.stringify's default `{ type: 'Buffer', data: [byte, ...] }`, which
+ * takes ~3.6 bytes of JSON per byte and a number parse per byte on load.
+ * Done up front rather than with a replacer so stringify keeps V8's fast path.
+ */
+function encodeBuffers(value) {
+  if (ArrayBuffer.isView(value)) {
+    return { type: 'Buffer', base64: Buffer.from(value.buffer, value.byteOffset, value.byteLength).toString('base64') };
+  }
+  if (Array.isArray(value)) {
+    return value.map(encodeBuffers);
+  }
+  if (value && typeof value === 'object') {
+    const encoded = {};
+    for (const key in value) {
+      encoded[key] = encodeBuffers(value[key]);
+    }
+    return encoded;
+  }
+  return value;
+}
+
+/**
+ * Restore Buffers in parsed JSON, in place: from base64, and from the legacy
+ * byte-array form so stores written by older versions still load.
+ * A walk after JSON.parse is cheaper than a reviver called for every value.
+ */
+function decodeBuffers(value) {
+  if (Array.isArray(value)) {
+    for (let i = 0; i < value.length; i++) {
+      value[i] = decodeBuffers(value[i]);
+    }
+  } else if (value && typeof value === 'object') {
+    if (value.type === 'Buffer') {
+      if (typeof value.base64 === 'string') {
+        return Buffer.from(value.base64, 'base64');
+      }
+      if (Array.isArray(value.data)) {
+        return Buffer.from(value.data);
+      }
+    }
+    for (const key in value) {
+      value[key] = decodeBuffers(value[key]);
+    }
+  }
+  return value;
+}
+
+function parseStore(data) {
+  return decodeBuffers(JSON.parse(data));
+}
+
+/**
+ * Deep copy of a record, Buffers included. Records handed out or cached are
+ * copied so that changes to nested fields (retryMetadata, errors) on either
+ * side never reach the other.
+ */
+function copyRecord(value) {
+  if (ArrayBuffer.isView(value)) {
+    return Buffer.isBuffer(value) ? Buffer.from(value) : value.slice();
+  }
+  if (Array.isArray(value)) {
+    return value.map(copyRecord);
+  }
+  if (value && typeof value === 'object') {
+    const copy = {};
+    for (const key in value) {
+      copy[key] = copyRecord(value[key]);
+    }
+    return copy;
+  }
+  return value;
+}
+
 /**
  * Enhanced IndexedDB-compatible storage with encryption support
  * 
@@ -12,76 +126,279 @@ const logger = createLogger({ prefix: '[EncryptedDB]' });
  * - sessions: { sessionId, kid, wrappedKey, createdAt }
  * - packets: { id, sessionId, seq, iv, aad, ciphertext, authTag, status }
  * - keyCache: { kid, publicKey, fetchedAt, expiresAt }
+ *
+ * Packet ciphertext is stored in payloads/<id>.bin rather than packets.json.
  */
 
 class EncryptedDB {
-  constructor(dbName, version) {
+  constructor(dbName, version, options = {}) {
     this.dbName = dbName;
     this.version = version;
-    this.dbPath = path.join(os.homedir(), '.indexcp', 'encrypted-db');
+    this.dbPath = options.dbPath ||
+      process.env.INDEXEDCP_ENCRYPTED_DB_PATH ||
+      path.join(os.homedir(), '.indexcp', 'encrypted-db');
     this.sessionsPath = path.join(this.dbPath, 'sessions.json');
     this.packetsPath = path.join(this.dbPath, 'packets.json');
     this.keyCachePath = path.join(this.dbPath, 'key-cache.json');
+    this.payloadsPath = path.join(this.dbPath, 'payloads');
+    // Resolved once; per-record paths are built by concatenation
+    this.storePaths = new Map([
+      ['sessions', this.sessionsPath],
+      ['packets', this.packetsPath],
+      ['keyCache', this.keyCachePath]
+    ]);
+    this.payloadsPrefix = this.payloadsPath + path.sep;
+    // Parsed stores, reused while their file is unchanged on disk
+    this.storeCache = new Map(); // storeName -> { version, records, positions, fieldIndexes }
+    // Store files are read and written asynchronously. Writes run one at a
+    // time, after every earlier operation; reads queued between two writes
+    // run alongside each other.
+    this.queue = Promise.resolve();
+    this.reads = []; // reads started since the last queued write
+    this.operations = 0; // operations queued so far
+    // put() calls queued back to back are written together
+    this.pendingPuts = new Map(); // storeName -> { records, done, operation }
     this.ensureDbDir();
   }
 
+  /**
+   * Run an operation after every previously queued one has finished
+   */
+  exclusive(operation) {
+    this.operations++;
+    const ready = this.reads.length > 0 ? Promise.all([this.queue, ...this.reads]) : this.queue;
+    this.reads = [];
+    const result = ready.then(operation);
+    this.queue = result.catch(() => {});
+    return result;
+  }
+
+  /**
+   * Run a read-only operation after every previously queued write has
+   * finished, concurrently with other reads
+   */
+  shared(operation) {
+    this.operations++;
+    const result = this.queue.then(operation);
+    this.reads.push(result.catch(() => {}));
+    return result;
+  }
+
   ensureDbDir() {
-    if (!fs.existsSync(this.dbPath)) {
-      fs.mkdirSync(this.dbPath, { recursive: true });
+    if (!fs.existsSync(this.payloadsPath)) {
+      fs.mkdirSync(this.payloadsPath, { recursive: true });
+    }
+  }
+
+  getPayloadPath(key) {
+    return `${this.payloadsPrefix}${encodeURIComponent(key)}.bin`;
+  }
+
+  /**
+   * Write a record's payload field to its own file.
+   * Returns the record as kept in the JSON store (without the payload).
+   * A record without the field keeps the payload file it already has, so
+   * status updates can leave the payload out instead of rewriting it.
+   */
+  async detachPayload(storeName, record) {
+    const field = PAYLOAD_FIELDS[storeName];
+    if (!field || !ArrayBuffer.isView(record[field])) {
+      return record;
+    }
+    const { [field]: payload, ...stored } = record;
+    await writeFileAtomic(this.getPayloadPath(record[this.getKeyPath(storeName)]), payload);
+    return stored;
+  }
+
+  /**
+   * Read payload files back into records returned to callers
+   */
+  async attachPayloads(storeName, records) {
+    const field = PAYLOAD_FIELDS[storeName];
+    if (!field) {
+      return records;
+    }
+    const keyPath = this.getKeyPath(storeName);
+    const missing = records.filter(r => r[field] === undefined);
+    for (let i = 0; i < missing.length; i += PAYLOAD_IO_CONCURRENCY) {
+      await Promise.all(missing.slice(i, i + PAYLOAD_IO_CONCURRENCY).map(async record => {
+        const payloadPath = this.getPayloadPath(record[keyPath]);
+        try {
+          record[field] = await fs.promises.readFile(payloadPath);
+        } catch (error) {
+          if (error.code !== 'ENOENT') throw error;
+        }
+      }));
     }
+    return records;
   }
 
-  loadStore(storeName) {
-    let storePath;
-    switch (storeName) {
-      case 'sessions':
-        storePath = this.sessionsPath;
-        break;
-      case 'packets':
-        storePath = this.packetsPath;
-        break;
-      case 'keyCache':
-        storePath = this.keyCachePath;
-        break;
-      default:
-        throw new Error(`Unknown store: ${storeName}`);
+  async removePayloads(storeName, keys) {
+    if (!PAYLOAD_FIELDS[storeName]) {
+      return;
     }
+    for (let i = 0; i < keys.length; i += PAYLOAD_IO_CONCURRENCY) {
+      await Promise.all(keys.slice(i, i + PAYLOAD_IO_CONCURRENCY).map(key =>
+        fs.promises.rm(this.getPayloadPath(key), { force: true })));
+    }
+  }
+
+  getStorePath(storeName) {
+    const storePath = this.storePaths.get(storeName);
+    if (!storePath) {
+      throw new Error(`Unknown store: ${storeName}`);
+    }
+    return storePath;
+  }
+
+  /**
+   * Identify a store file's contents. Every save renames a new file into
+   * place, and that file is created while the one it replaces still holds
+   * its inode, so each write, here or by another process, changes the inode
+   * even when size and mtime match (same-size rewrites within a coarse
+   * mtime tick). Size and mtime still catch in-place rewrites by older
+   * versions.
+   */
+  async getStoreVersion(storePath) {
+    const stats = await fs.promises.stat(storePath, { bigint: true });
+    return `${stats.ino}:${stats.size}:${stats.mtimeNs}`;
+  }
+
+  /**
+   * Load a store's cache entry. Its records are shared with the cache:
+   * copy any record handed out, and only modify them right before saveStore.
+   */
+  async loadStoreEntry(storeName) {
+    const storePath = this.getStorePath(storeName);
 
     try {
-      if (fs.existsSync(storePath)) {
-        const data = fs.readFileSync(storePath, 'utf8');
-        return JSON.parse(data);
+      const version = await this.getStoreVersion(storePath);
+      let entry = this.storeCache.get(storeName);
+      if (!entry || entry.version !== version) {
+        const data = await fs.promises.readFile(storePath, 'utf8');
+        entry = { version, records: parseStore(data), positions: null, fieldIndexes: null };
+        this.storeCache.set(storeName, entry);
       }
+      return entry;
     } catch (error) {
-      logger.warn(`Failed to load store ${storeName}:`, error.message);
+      this.storeCache.delete(storeName);
+      if (error.code !== 'ENOENT') {
+        logger.warn(`Failed to load store ${storeName}:`, error.message);
+      }
+    }
+    return { version: null, records: [], positions: null, fieldIndexes: null };
+  }
+
+  /**
+   * Index of each key in a store entry's records, built on first use and
+   * kept with the cached store so upserts and lookups skip a linear scan
+   */
+  getStorePositions(storeName, entry) {
+    if (!entry.positions) {
+      const keyPath = this.getKeyPath(storeName);
+      entry.positions = new Map();
+      entry.records.forEach((record, index) => {
+        if (!entry.positions.has(record[keyPath])) {
+          entry.positions.set(record[keyPath], index);
+        }
+      });
+    }
+    return entry.positions;
+  }
+
+  async loadStore(storeName) {
+    const { records } = await this.loadStoreEntry(storeName);
+    // Callers modify the records they load
+    return records.map(copyRecord);
+  }
+
+  /**
+   * Positions of the records holding each value of a field, built on first
+   * query and kept until the store is next saved, so repeated queries on a
+   * field (status, sessionId) skip the scan
+   */
+  getFieldIndex(entry, field) {
+    if (!entry.fieldIndexes) {
+      entry.fieldIndexes = new Map();
     }
-    return [];
+    let index = entry.fieldIndexes.get(field);
+    if (!index) {
+      index = new Map();
+      entry.records.forEach((record, position) => {
+        const matches = index.get(record[field]);
+        if (matches) {
+          matches.push(position);
+        } else {
+          index.set(record[field], [position]);
+        }
+      });
+      entry.fieldIndexes.set(field, index);
+    }
+    return index;
+  }
+
+  /**
+   * Load copies of only the records whose field has the given value
+   */
+  async loadIndexed(storeName, field, value) {
+    const entry = await this.loadStoreEntry(storeName);
+    const positions = this.getFieldIndex(entry, field).get(value) || [];
+    return positions.map(position => copyRecord(entry.records[position]));
   }
 
-  saveStore(storeName, records) {
-    let storePath;
-    switch (storeName) {
-      case 'sessions':
-        storePath = this.sessionsPath;
-        break;
-      case 'packets':
-        storePath = this.packetsPath;
-        break;
-      case 'keyCache':
-        storePath = this.keyCachePath;
-        break;
-      default:
-        throw new Error(`Unknown store: ${storeName}`);
+  /**
+   * Insert or replace records in the store entry and save it. Payloads are
+   * written first, so a failure leaves the cached entry untouched.
+   */
+  async upsertRecords(storeName, records) {
+    const keyPath = this.getKeyPath(storeName);
+    // Last record per key, in first-seen key order: the same end state as
+    // applying them one by one, with at most one payload write per file
+    const latest = new Map();
+    for (const record of records) {
+      latest.set(record[keyPath], record);
     }
+    
+    // Payload files are written concurrently, then the store once
+    const pending = [...latest.values()];
+    const detached = [];
+    for (let i = 0; i < pending.length; i += PAYLOAD_IO_CONCURRENCY) {
+      detached.push(...await Promise.all(pending.slice(i, i + PAYLOAD_IO_CONCURRENCY)
+        .map(record => this.detachPayload(storeName, record))));
+    }
+    
+    const entry = await this.loadStoreEntry(storeName);
+    const positions = this.getStorePositions(storeName, entry);
+    for (const record of detached) {
+      const index = positions.get(record[keyPath]);
+      if (index !== undefined) {
+        entry.records[index] = record;
+      } else {
+        positions.set(record[keyPath], entry.records.length);
+        entry.records.push(record);
+      }
+    }
+    
+    await this.saveStore(storeName, entry.records, positions);
+  }
+
+  async saveStore(storeName, records, positions = null) {
+    const storePath = this.getStorePath(storeName);
 
     try {
+      this.storeCache.delete(storeName);
       if (records.length === 0) {
         // Delete the file if there are no records
-        if (fs.existsSync(storePath)) {
-          fs.unlinkSync(storePath);
-        }
+        await fs.promises.rm(storePath, { force: true });
       } else {
-        fs.writeFileSync(storePath, JSON.stringify(records, null, 2));
+        // Payloads are written before the store that refers to them
+        await writeFileAtomic(storePath, JSON.stringify(encodeBuffers(records)));
+        this.storeCache.set(storeName, {
+          version: await this.getStoreVersion(storePath),
+          records: records.map(copyRecord),
+          positions,
+          fieldIndexes: null
+        });
       }
     } catch (error) {
       logger.error(`Failed to save store ${storeName}:`, error.message);
@@ -89,71 +406,107 @@ class EncryptedDB {
     }
   }
 
-  async add(storeName, record) {
-    const records = this.loadStore(storeName);
-    
-    // Auto-generate ID if not present
-    if (!record.id && storeName === 'packets') {
-      record.id = `${record.sessionId}-${record.seq}`;
-    }
-    
-    records.push(record);
-    this.saveStore(storeName, records);
-    return record;
+  add(storeName, record) {
+    return this.exclusive(async () => {
+      const records = await this.loadStore(storeName);
+      
+      // Auto-generate ID if not present
+      if (!record.id && storeName === 'packets') {
+        record.id = `${record.sessionId}-${record.seq}`;
+      }
+      
+      records.push(await this.detachPayload(storeName, record));
+      await this.saveStore(storeName, records);
+      return record;
+    });
   }
 
-  async put(storeName, record) {
-    const records = this.loadStore(storeName);
-    
-    // Find and replace existing record or add new
-    const keyPath = this.getKeyPath(storeName);
-    const keyValue = record[keyPath];
-    const index = records.findIndex(r => r[keyPath] === keyValue);
-    
-    if (index >= 0) {
-      records[index] = record;
-    } else {
-      records.push(record);
+  /**
+   * Replace the record with the same key, or add it. Puts to the same store
+   * with nothing queued in between share one load/save of the store.
+   */
+  put(storeName, record) {
+    let batch = this.pendingPuts.get(storeName);
+    if (!batch || batch.operation !== this.operations) {
+      const records = [];
+      batch = {
+        records,
+        done: this.exclusive(async () => {
+          if (this.pendingPuts.get(storeName) === batch) {
+            this.pendingPuts.delete(storeName);
+          }
+          await this.upsertRecords(storeName, records);
+        }),
+        operation: this.operations
+      };
+      this.pendingPuts.set(storeName, batch);
     }
-    
-    this.saveStore(storeName, records);
-    return record;
+    batch.records.push(record);
+    return batch.done.then(() => record);
   }
 
-  async get(storeName, key) {
-    const records = this.loadStore(storeName);
-    const keyPath = this.getKeyPath(storeName);
-    return records.find(r => r[keyPath] === key);
+  /**
+   * Insert or replace several records with a single load/save of the store
+   */
+  putMany(storeName, records) {
+    return this.exclusive(async () => {
+      await this.upsertRecords(storeName, records);
+      return records;
+    });
   }
 
-  async delete(storeName, key) {
-    const records = this.loadStore(storeName);
-    const keyPath = this.getKeyPath(storeName);
-    const filteredRecords = records.filter(r => r[keyPath] !== key);
-    this.saveStore(storeName, filteredRecords);
-    return true;
+  get(storeName, key) {
+    return this.shared(async () => {
+      const entry = await this.loadStoreEntry(storeName);
+      const index = this.getStorePositions(storeName, entry).get(key);
+      if (index === undefined) {
+        return undefined;
+      }
+      return (await this.attachPayloads(storeName, [copyRecord(entry.records[index])]))[0];
+    });
+  }
+
+  delete(storeName, key) {
+    return this.exclusive(async () => {
+      const { records } = await this.loadStoreEntry(storeName);
+      const keyPath = this.getKeyPath(storeName);
+      const filteredRecords = records.filter(r => r[keyPath] !== key);
+      if (filteredRecords.length < records.length) {
+        await this.saveStore(storeName, filteredRecords);
+      }
+      await this.removePayloads(storeName, [key]);
+      return true;
+    });
   }
 
-  async getAll(storeName) {
-    return this.loadStore(storeName);
+  getAll(storeName) {
+    return this.shared(async () =>
+      this.attachPayloads(storeName, await this.loadStore(storeName)));
   }
 
-  async getAllFromIndex(storeName, indexName, value) {
-    const records = this.loadStore(storeName);
-    return records.filter(r => r[indexName] === value);
+  getAllFromIndex(storeName, indexName, value) {
+    return this.shared(async () => {
+      return this.attachPayloads(storeName,
+        await this.loadIndexed(storeName, indexName, value));
+    });
+  }
+
+  /**
+   * Count records without copying them or reading their payloads
+   */
+  count(storeName) {
+    return this.shared(async () => (await this.loadStoreEntry(storeName)).records.length);
+  }
+
+  countFromIndex(storeName, indexName, value) {
+    return this.shared(async () => {
+      const positions = this.getFieldIndex(await this.loadStoreEntry(storeName), indexName).get(value);
+      return positions ? positions.length : 0;
+    });
   }
 
   getKeyPath(storeName) {
-    switch (storeName) {
-      case 'sessions':
-        return 'sessionId';
-      case 'packets':
-        return 'id';
-      case 'keyCache':
-        return 'kid';
-      default:
-        return 'id';
-    }
+    return KEY_PATHS.get(storeName) || 'id';
   }
 
   transaction(storeNames, mode) {
@@ -165,9 +518,11 @@ class EncryptedDB {
       storeHandlers[storeName] = {
         add: (record) => self.add(storeName, record),
         put: (record) => self.put(storeName, record),
+        putMany: (records) => self.putMany(storeName, records),
         get: (key) => self.get(storeName, key),
         delete: (key) => self.delete(storeName, key),
         getAll: () => self.getAll(storeName),
+        count: () => self.count(storeName),
         index: (indexName) => ({
           getAll: (value) => self.getAllFromIndex(storeName, indexName, value)
         })
@@ -180,37 +535,107 @@ class EncryptedDB {
     };
   }
 
+  /**
+   * Rewrite stores that still hold Buffers in the legacy byte-array form.
+   * Runs once on open; after that every save uses base64.
+   */
+  migrateLegacyBuffers() {
+    return this.exclusive(async () => {
+      for (const storeName of STORE_NAMES) {
+        const storePath = this.getStorePath(storeName);
+        try {
+          const data = await fs.promises.readFile(storePath, 'utf8');
+          if (!LEGACY_BUFFER_PATTERN.test(data)) {
+            continue;
+          }
+          await this.saveStore(storeName, parseStore(data));
+          logger.info(`Migrated ${storeName} store to base64 binary encoding`);
+        } catch (error) {
+          if (error.code !== 'ENOENT') {
+            logger.warn(`Failed to migrate store ${storeName}:`, error.message);
+          }
+        }
+      }
+    });
+  }
+
+  /**
+   * Move payloads still stored inline (by older versions) out to payload
+   * files. Runs once on open.
+   */
+  migrateInlinePayloads() {
+    return this.exclusive(async () => {
+      for (const storeName of Object.keys(PAYLOAD_FIELDS)) {
+        const field = PAYLOAD_FIELDS[storeName];
+        try {
+          const records = await this.loadStore(storeName);
+          if (!records.some(r => ArrayBuffer.isView(r[field]))) {
+            continue;
+          }
+          const stored = [];
+          for (const record of records) {
+            stored.push(await this.detachPayload(storeName, record));
+          }
+          await this.saveStore(storeName, stored);
+          logger.info(`Moved ${storeName} payloads to ${this.payloadsPath}`);
+        } catch (error) {
+          logger.warn(`Failed to migrate ${storeName} payloads:`, error.message);
+        }
+      }
+    });
+  }
+
   /**
    * Cleanup old packets by session ID
    */
-  async cleanupSession(sessionId) {
-    const packets = this.loadStore('packets');
-    const filteredPackets = packets.filter(p => p.sessionId !== sessionId);
-    this.saveStore('packets', filteredPackets);
-    
-    const sessions = this.loadStore('sessions');
-    const filteredSessions = sessions.filter(s => s.sessionId !== sessionId);
-    this.saveStore('sessions', filteredSessions);
+  cleanupSession(sessionId) {
+    return this.exclusive(async () => {
+      // Filters read the cached stores directly; saveStore copies what it keeps
+      const { records: packets } = await this.loadStoreEntry('packets');
+      const filteredPackets = [];
+      const removedIds = [];
+      for (const packet of packets) {
+        if (packet.sessionId === sessionId) {
+          removedIds.push(packet.id);
+        } else {
+          filteredPackets.push(packet);
+        }
+      }
+      if (removedIds.length > 0) {
+        await this.saveStore('packets', filteredPackets);
+        await this.removePayloads('packets', removedIds);
+      }
+      
+      const { records: sessions } = await this.loadStoreEntry('sessions');
+      const filteredSessions = sessions.filter(s => s.sessionId !== sessionId);
+      if (filteredSessions.length < sessions.length) {
+        await this.saveStore('sessions', filteredSessions);
+      }
+    });
   }
 
   /**
    * Get pending packets for upload
    */
-  async getPendingPackets() {
-    const packets = this.loadStore('packets');
-    return packets.filter(p => p.status === 'pending');
+  getPendingPackets() {
+    return this.shared(async () => {
+      return this.attachPayloads('packets',
+        await this.loadIndexed('packets', 'status', 'pending'));
+    });
   }
 
   /**
    * Update packet status
    */
-  async updatePacketStatus(packetId, status) {
-    const packets = this.loadStore('packets');
-    const packet = packets.find(p => p.id === packetId);
-    if (packet) {
-      packet.status = status;
-      this.saveStore('packets', packets);
-    }
+  updatePacketStatus(packetId, status) {
+    return this.exclusive(async () => {
+      const entry = await this.loadStoreEntry('packets');
+      const index = this.getStorePositions('packets', entry).get(packetId);
+      if (index !== undefined) {
+        entry.records[index] = { ...entry.records[index], status };
+        await this.saveStore('packets', entry.records, entry.positions);
+      }
+    });
   }
 }
 
@@ -218,7 +643,9 @@ class EncryptedDB {
  * Factory function to create EncryptedDB instance
  */
 async function openEncryptedDB(dbName, version, options) {
-  const db = new EncryptedDB(dbName, version);
+  const db = new EncryptedDB(dbName, version, options);
+  await db.migrateLegacyBuffers();
+  await db.migrateInlinePayloads();
   
   // Run upgrade if provided
   if (options && options.upgrade) {
@@ -232,7 +659,7 @@ async function openEncryptedDB(dbName, version, options) {
         };
       },
       objectStoreNames: {
-        contains: (name) => ['sessions', 'packets', 'keyCache'].includes(name)
+        contains: (name) => STORE_NAMES.includes(name)
       }
     };
     options.upgrade(mockDB);
@@ -9,6 +9,10 @@ const { createLogger } = require('../logger');
  * - loadAll()
  * - delete(kid)
  * - exists(kid)
+ *
+ * The server only ever calls these methods (it never checks instanceof),
+ * so any object with the same async methods works as `keyStore`. Extending
+ * this class is the documented way to get the shared logger and defaults.
  */
 
 class BaseKeyStore {
@@ -17,6 +21,22 @@ class BaseKeyStore {
       level: options.logLevel,
       prefix: `[${this.constructor.name}]`
     });
+    // LRU of loaded keys for implementations that cache reads;
+    // Map iteration order doubles as recency order
+    this.cache = new Map();
+    this.cacheSize = options.cacheSize ?? 128;
+  }
+
+  /**
+   * Insert or refresh a key in the LRU cache, evicting the least recent
+   * @protected
+   */
+  cacheSet(kid, keyData) {
+    this.cache.delete(kid);
+    this.cache.set(kid, keyData);
+    if (this.cache.size > this.cacheSize) {
+      this.cache.delete(this.cache.keys().next().value);
+    }
   }
 
   /**
@@ -61,6 +81,17 @@ class BaseKeyStore {
     throw new Error('delete() must be implemented by subclass');
   }
 
+  /**
+   * Delete several keys. Implementations backed by a database should
+   * override this with a single bulk delete.
+   * @param {string[]} kids - Key IDs
+   * @returns {Promise<number>} Number of keys deleted
+   */
+  async deleteMany(kids) {
+    const results = await Promise.all(kids.map(kid => this.delete(kid)));
+    return results.filter(Boolean).length;
+  }
+
   /**
    * Check if a key exists
    * @param {string} kid - Key ID
@@ -2,6 +2,9 @@ const fs = require('fs').promises;
 const path = require('path');
 const BaseKeyStore = require('./base-keystore');
 
+// Distinguishes temp files of concurrent saves within this process
+let tmpFileCounter = 0;
+
 /**
  * Filesystem-based KeyStore implementation
  * 
@@ -25,22 +28,43 @@ class FileSystemKeyStore extends BaseKeyStore {
     }
   }
 
+  /**
+   * Write the key to a temp file, fsync it and rename it over the key file,
+   * so readers only ever see a complete file, even if the writer crashes
+   */
   async save(kid, keyData) {
+    const keyFile = path.join(this.keyStorePath, `${kid}${this.fileExtension}`);
+    const tmpFile = `${keyFile}.${process.pid}.${++tmpFileCounter}.tmp`;
     try {
-      const keyFile = path.join(this.keyStorePath, `${kid}${this.fileExtension}`);
-      await fs.writeFile(keyFile, JSON.stringify(keyData, null, 2), 'utf-8');
+      // Private keys: create owner-only, so the file is never readable by others
+      const handle = await fs.open(tmpFile, 'w', 0o600);
+      try {
+        await handle.writeFile(JSON.stringify(keyData), 'utf-8');
+        await handle.sync();
+      } finally {
+        await handle.close();
+      }
+      await fs.rename(tmpFile, keyFile);
+      this.cacheSet(kid, { ...keyData });
       this.logger.info(`🔑 Persisted key to filesystem: ${kid}`);
     } catch (error) {
+      await fs.rm(tmpFile, { force: true });
       this.logger.error(`Failed to save key ${kid}:`, error);
       throw error;
     }
   }
 
   async load(kid) {
+    const cached = this.cache.get(kid);
+    if (cached) {
+      this.cacheSet(kid, cached);
+      return { ...cached };
+    }
     try {
       const keyFile = path.join(this.keyStorePath, `${kid}${this.fileExtension}`);
-      const data = await fs.readFile(keyFile, 'utf-8');
-      return JSON.parse(data);
+      const keyData = JSON.parse(await fs.readFile(keyFile, 'utf-8'));
+      this.cacheSet(kid, keyData);
+      return { ...keyData };
     } catch (error) {
       if (error.code === 'ENOENT') {
         return null; // Key not found
@@ -53,11 +77,13 @@ class FileSystemKeyStore extends BaseKeyStore {
   async loadAll() {
     try {
       await fs.mkdir(this.keyStorePath, { recursive: true });
-      const files = await fs.readdir(this.keyStorePath);
+      // Dirents carry the entry type, so no per-file stat is needed
+      const entries = await fs.readdir(this.keyStorePath, { withFileTypes: true });
       
       const keys = [];
-      for (const file of files) {
-        if (!file.endsWith(this.fileExtension)) {
+      for (const entry of entries) {
+        const file = entry.name;
+        if (!entry.isFile() || !file.endsWith(this.fileExtension)) {
           continue;
         }
         
@@ -79,6 +105,7 @@ class FileSystemKeyStore extends BaseKeyStore {
   }
 
   async delete(kid) {
+    this.cache.delete(kid);
     try {
       const keyFile = path.join(this.keyStorePath, `${kid}${this.fileExtension}`);
       await fs.unlink(keyFile);
@@ -94,6 +121,9 @@ class FileSystemKeyStore extends BaseKeyStore {
   }
 
   async exists(kid) {
+    if (this.cache.has(kid)) {
+      return true;
+    }
     try {
       const keyFile = path.join(this.keyStorePath, `${kid}${this.fileExtension}`);
       await fs.access(keyFile);
@@ -105,17 +135,17 @@ class FileSystemKeyStore extends BaseKeyStore {
 
   async list() {
     try {
-      const files = await fs.readdir(this.keyStorePath);
-      return files
-        .filter(f => f.endsWith(this.fileExtension))
-        .map(f => f.replace(this.fileExtension, ''));
+      const entries = await fs.readdir(this.keyStorePath, { withFileTypes: true });
+      return entries
+        .filter(e => e.isFile() && e.name.endsWith(this.fileExtension))
+        .map(e => e.name.replace(this.fileExtension, ''));
     } catch (error) {
       return [];
     }
   }
 
   async close() {
-    // No resources to clean up for filesystem
+    this.cache.clear();
   }
 }
 
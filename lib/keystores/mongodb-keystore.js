@@ -61,6 +61,8 @@ class MongoDBKeyStore extends BaseKeyStore {
         },
         { upsert: true }
       );
+      // $set merges into any existing document; reload it on next access
+      this.cache.delete(kid);
       
       this.logger.info(`🔑 Persisted key to MongoDB: ${kid}`);
     } catch (error) {
@@ -70,6 +72,11 @@ class MongoDBKeyStore extends BaseKeyStore {
   }
 
   async load(kid) {
+    const cached = this.cache.get(kid);
+    if (cached) {
+      this.cacheSet(kid, cached);
+      return { ...cached };
+    }
     try {
       const doc = await this.collection.findOne({ kid });
       
@@ -79,7 +86,8 @@ class MongoDBKeyStore extends BaseKeyStore {
       
       // Remove MongoDB _id field
       const { _id, updatedAt, ...keyData } = doc;
-      return keyData;
+      this.cacheSet(kid, keyData);
+      return { ...keyData };
     } catch (error) {
       this.logger.error(`Failed to load key ${kid} from MongoDB:`, error);
       throw error;
@@ -104,6 +112,7 @@ class MongoDBKeyStore extends BaseKeyStore {
   async delete(kid) {
     try {
       const result = await this.collection.deleteOne({ kid });
+      this.cache.delete(kid);
       
       if (result.deletedCount > 0) {
         this.logger.info(`🗑️  Deleted key from MongoDB: ${kid}`);
@@ -117,10 +126,31 @@ class MongoDBKeyStore extends BaseKeyStore {
     }
   }
 
+  async deleteMany(kids) {
+    try {
+      // One round trip and one index scan instead of a deleteOne per key
+      const result = await this.collection.deleteMany({ kid: { $in: kids } });
+      for (const kid of kids) {
+        this.cache.delete(kid);
+      }
+      
+      this.logger.info(`🗑️  Deleted ${result.deletedCount} key(s) from MongoDB`);
+      return result.deletedCount;
+    } catch (error) {
+      this.logger.error('Failed to delete keys from MongoDB:', error);
+      throw error;
+    }
+  }
+
   async exists(kid) {
+    if (this.cache.has(kid)) {
+      return true;
+    }
     try {
-      const count = await this.collection.countDocuments({ kid }, { limit: 1 });
-      return count > 0;
+      // An indexed findOne returning only _id; countDocuments would run an
+      // aggregation pipeline for the same answer
+      const doc = await this.collection.findOne({ kid }, { projection: { _id: 1 } });
+      return doc !== null;
     } catch (error) {
       this.logger.error(`Failed to check existence of key ${kid}:`, error);
       return false;
@@ -143,6 +173,7 @@ class MongoDBKeyStore extends BaseKeyStore {
   async close() {
     // Note: We don't close the client here as it may be shared
     // The application should manage the MongoDB client lifecycle
+    this.cache.clear();
     this.logger.info('✓ MongoDB keystore closed (client still managed by application)');
   }
 
@@ -158,6 +189,7 @@ class MongoDBKeyStore extends BaseKeyStore {
         createdAt: { $lt: cutoff },
         active: { $ne: true } // Don't delete active keys
       });
+      this.cache.clear();
       
       this.logger.info(`🧹 Cleaned up ${result.deletedCount} old keys from MongoDB`);
       return result.deletedCount;
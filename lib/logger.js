@@ -1,5 +1,23 @@
 const log = require('console-log-level');
 
+const LEVELS = ['trace', 'debug', 'info', 'warn', 'error', 'fatal'];
+const noop = () => {};
+
+// One underlying console logger per level, shared by every prefixed wrapper
+const baseLoggers = new Map();
+// Prefixed loggers by `${level}|${prefix}`; they hold no state, so
+// every instance asking for the same pair can share one
+const prefixedLoggers = new Map();
+
+function getBaseLogger(level) {
+  let logger = baseLoggers.get(level);
+  if (!logger) {
+    logger = log({ level });
+    baseLoggers.set(level, logger);
+  }
+  return logger;
+}
+
 /**
  * Create a logger instance with the specified log level
  * @param {Object} options - Logger options
@@ -11,16 +29,26 @@ function createLogger(options = {}) {
   const level = options.level || process.env.INDEXEDCP_LOG_LEVEL || 'info';
   const prefix = options.prefix || '';
   
-  const logger = log({ level });
+  const logger = getBaseLogger(level);
   
-  // If a prefix is provided, wrap the logger methods to include it
+  // If a prefix is provided, wrap the logger methods to include it.
+  // Methods are resolved once here: levels below the threshold become a
+  // no-op and the rest bind the prefix, so no per-call argument arrays.
   if (prefix) {
+    const cacheKey = `${level}|${prefix}`;
+    const cached = prefixedLoggers.get(cacheKey);
+    if (cached) {
+      return cached;
+    }
+    
+    const threshold = LEVELS.indexOf(level);
     const wrappedLogger = {};
-    ['trace', 'debug', 'info', 'warn', 'error', 'fatal'].forEach(method => {
-      wrappedLogger[method] = (...args) => {
-        logger[method](prefix, ...args);
-      };
+    LEVELS.forEach((method, i) => {
+      wrappedLogger[method] = i >= threshold
+        ? logger[method].bind(logger, prefix)
+        : noop;
     });
+    prefixedLoggers.set(cacheKey, wrappedLogger);
     return wrappedLogger;
   }
   
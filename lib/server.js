@@ -2,13 +2,94 @@ const http = require('http');
 const fs = require('fs');
 const path = require('path');
 const crypto = require('crypto');
+const zlib = require('zlib');
 const { createLogger } = require('./logger');
 
+/**
+ * Create a decompression stream for a request Content-Encoding
+ * @param {string} encoding - Content-Encoding header value
+ * @returns {stream.Transform|null} - Decoder, or null if unsupported
+ */
+function createDecoder(encoding) {
+  switch (encoding) {
+    case 'gzip':
+      return zlib.createGunzip();
+    case 'deflate':
+      return zlib.createInflate();
+    case 'zstd':
+      return typeof zlib.createZstdDecompress === 'function' ? zlib.createZstdDecompress() : null;
+    default:
+      return null;
+  }
+}
+
+// Leading "./" and/or ".\" that clients may put before relative names
+const LEADING_RELATIVE_PREFIX = /^(?:\.\/)?(?:\.\\)?/;
+// Runs of '/' or '\' path separators
+const PATH_SEPARATORS = /[/\\]+/g;
+// Anything other than letters, digits, '.', '_' and '-'
+const UNSAFE_FILENAME_CHARS = /[^a-zA-Z0-9._-]/g;
+// Most filesystems support 255-character names
+const MAX_FILENAME_LENGTH = 255;
+
+// GET /health answers every probe with these same bytes
+const HEALTH_BODY = Buffer.from(JSON.stringify({ status: 'ok', service: 'IndexedCP Server' }));
+const HEALTH_HEADERS = {
+  'Content-Type': 'application/json',
+  'Content-Length': HEALTH_BODY.length
+};
+
+// Serialized bodies of the fixed error responses, built on first use
+const errorBodies = new Map();
+
+/**
+ * Get the JSON body for an error response with a constant message
+ * @param {string} error - Error message
+ * @returns {string}
+ */
+function errorBody(error) {
+  let body = errorBodies.get(error);
+  if (body === undefined) {
+    body = JSON.stringify({ error });
+    errorBodies.set(error, body);
+  }
+  return body;
+}
+
+/**
+ * 8 random hex characters for unique filenames. The first 8 characters of a
+ * v4 UUID are all random bits, and randomUUID() draws from Node's buffered
+ * entropy instead of calling into the CSPRNG for 4 bytes each time.
+ * @returns {string}
+ */
+function randomFileTag() {
+  return crypto.randomUUID().slice(0, 8);
+}
+
+/**
+ * Check whether a path exists without blocking the event loop
+ * @param {string} file
+ * @returns {Promise<boolean>}
+ */
+function pathExists(file) {
+  return fs.promises.access(file).then(() => true, () => false);
+}
+
 class IndexedCPServer {
   constructor(options = {}) {
     this.outputDir = options.outputDir || process.cwd();
+    this.resolvedOutputDir = path.resolve(this.outputDir);
+    // Prefix every contained path starts with ('/' itself already ends in one).
+    // Single-component names are joined onto it by plain concatenation, so
+    // output paths are built without path.join's normalization pass.
+    this.outputDirPrefix = this.resolvedOutputDir.endsWith(path.sep)
+      ? this.resolvedOutputDir
+      : this.resolvedOutputDir + path.sep;
     this.port = options.port || 3000;
     this.apiKey = options.apiKey || this.generateApiKey();
+    // Expected Authorization header, compared in constant time per request.
+    // Encoded latin1, as Node decodes header values, so the bytes compare 1:1
+    this.expectedAuthHeader = Buffer.from(`Bearer ${this.apiKey}`, 'latin1');
     this.filenameGenerator = options.filenameGenerator || null; // Optional custom filename generator
     
     // Logger configuration
@@ -22,9 +103,41 @@ class IndexedCPServer {
     // 'sanitize' - Strip all paths, prevent overwrites with unique suffix
     // 'allow-paths' - Allow client to create subdirectories
     this.pathMode = options.pathMode || 'ignore';
+    // The mode is fixed, so pick its path resolver once instead of per chunk
+    this.resolveOutputPath = ({
+      'ignore': this.resolveIgnoreModePath,
+      'allow-paths': this.resolveAllowPathsModePath
+    }[this.pathMode] || this.resolveSanitizeModePath).bind(this);
+    // Directory handleUpload creates before writing; 'allow-paths' already
+    // creates each file's parent (under outputDir) while resolving the path
+    this.uploadDir = this.pathMode === 'allow-paths' ? null : this.outputDir;
     
     // Track filenames across chunks for the same upload session
+    // Upload sessions as two parallel maps: names are written once, while
+    // only the access map is reordered on each chunk (least recent first).
+    // Bounded by maxUploadSessions and expired after uploadSessionTTL idle ms.
     this.uploadSessions = new Map(); // clientFileName -> actualFileName
+    this.uploadSessionAccess = new Map(); // clientFileName -> last access (ms)
+    this.maxUploadSessions = options.maxUploadSessions || 10000;
+    this.uploadSessionTTL = options.uploadSessionTTL || 60 * 60 * 1000;
+    this.evictedUploadSessions = 0;
+    this.sessionReaper = null;
+    
+    // Append descriptors kept open across chunks of the same file, least
+    // recently used first: outputFile -> { fd: Promise<number>, writers }
+    this.openFiles = new Map();
+    this.maxOpenFiles = options.maxOpenFiles || 512;
+    // 'ignore' mode writes every chunk to a new unique file, so nothing
+    // would reuse a cached descriptor: each one closes after its write
+    this.cacheOutputFiles = this.pathMode !== 'ignore';
+    // Body data buffered per chunk while a write is in flight; everything
+    // buffered is flushed with one writev, so small socket reads coalesce
+    this.writeBufferSize = options.writeBufferSize || 1024 * 1024;
+    // Opt-in durability: fsync each chunk before acknowledging it. Chunks of
+    // one file finishing within syncInterval ms share a single fsync.
+    this.syncWrites = options.syncWrites || false;
+    this.syncInterval = options.syncInterval ?? 5;
+    this.pendingSyncs = new Map(); // outputFile -> Promise of its next fsync
     
     // Encryption support (optional)
     this.encryption = options.encryption || false;
@@ -49,6 +162,7 @@ class IndexedCPServer {
       }
       
       this.maxKeyAge = options.maxKeyAge || (90 * 24 * 60 * 60 * 1000); // 90 days default
+      this.keySize = options.keySize || 3072; // RSA modulus length in bits
     }
     
     this.server = null;
@@ -58,6 +172,21 @@ class IndexedCPServer {
     return crypto.randomBytes(32).toString('hex');
   }
 
+  /**
+   * Check an Authorization header against "Bearer <apiKey>" without leaking
+   * through timing how much of the key matched
+   * @param {string|undefined} authHeader
+   * @returns {boolean}
+   */
+  isAuthorized(authHeader) {
+    if (!authHeader) {
+      return false;
+    }
+    const provided = Buffer.from(authHeader, 'latin1');
+    return provided.length === this.expectedAuthHeader.length &&
+      crypto.timingSafeEqual(provided, this.expectedAuthHeader);
+  }
+
   // ============================================================================
   // Encryption Methods (only used when encryption: true)
   // ============================================================================
@@ -70,7 +199,12 @@ class IndexedCPServer {
     if (!this.encryption) return;
     
     try {
-      const keys = await this.keyStore.loadAll();
+      const loaded = await this.keyStore.loadAll();
+      const valid = this.cryptoUtils.isValidKeyIds(loaded.map(keyData => keyData.kid));
+      const keys = loaded.filter((keyData, i) => valid[i]);
+      if (keys.length < loaded.length) {
+        this.logger.warn(`⚠ Skipped ${loaded.length - keys.length} persisted key(s) with malformed key IDs`);
+      }
       
       for (const keyData of keys) {
         this.keyPairs.set(keyData.kid, {
@@ -133,19 +267,27 @@ class IndexedCPServer {
       }
     }
     
-    for (const kid of expiredKeys) {
-      try {
-        await this.keyStore.delete(kid);
-        this.keyPairs.delete(kid);
-        this.logger.info(`✓ Cleaned up expired key: ${kid}`);
-      } catch (error) {
-        this.logger.warn(`⚠ Failed to cleanup key ${kid}:`, error.message);
+    if (expiredKeys.length === 0) return;
+    
+    try {
+      // One bulk delete; keystores that only implement the required
+      // methods fall back to deleting each key
+      if (typeof this.keyStore.deleteMany === 'function') {
+        await this.keyStore.deleteMany(expiredKeys);
+      } else {
+        await Promise.all(expiredKeys.map(kid => this.keyStore.delete(kid)));
       }
+    } catch (error) {
+      // Keys stay loaded and are retried on the next cleanup
+      this.logger.warn('⚠ Failed to cleanup expired keys:', error.message);
+      return;
     }
     
-    if (expiredKeys.length > 0) {
-      this.logger.info(`✓ Cleaned up ${expiredKeys.length} expired key(s)`);
+    for (const kid of expiredKeys) {
+      this.keyPairs.delete(kid);
+      this.logger.info(`✓ Cleaned up expired key: ${kid}`);
     }
+    this.logger.info(`✓ Cleaned up ${expiredKeys.length} expired key(s)`);
   }
 
   /**
@@ -157,7 +299,7 @@ class IndexedCPServer {
       throw new Error('Encryption not enabled. Set encryption: true in constructor.');
     }
     
-    const keyPair = await this.cryptoUtils.generateServerKeyPair();
+    const keyPair = await this.cryptoUtils.generateServerKeyPair(this.keySize);
     
     const keyData = {
       publicKey: keyPair.publicKey,
@@ -263,11 +405,29 @@ class IndexedCPServer {
   // ============================================================================
 
   createServer() {
+    // Route table built once, so each request is one lookup:
+    // "METHOD url" -> { handler, public }. Only public routes skip auth.
+    const routes = new Map([
+      ['POST /upload', { handler: this.handleUpload }]
+    ]);
+    if (this.encryption) {
+      routes.set('GET /public-key', { handler: this.handlePublicKeyRequest, public: true });
+      routes.set('POST /upload-encrypted', { handler: this.handleEncryptedUpload });
+      routes.set('POST /rotate-keys', { handler: this.handleKeyRotation });
+    }
+    
     this.server = http.createServer((req, res) => {
+      // Health probes (unauthenticated) skip the rest of the routing
+      if (req.method === 'GET' && req.url === '/health') {
+        res.writeHead(200, HEALTH_HEADERS);
+        res.end(HEALTH_BODY);
+        return;
+      }
+      
       // CORS headers for browser clients
       res.setHeader('Access-Control-Allow-Origin', '*');
       res.setHeader('Access-Control-Allow-Methods', 'GET, POST, OPTIONS');
-      res.setHeader('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Chunk-Index, X-File-Name');
+      res.setHeader('Access-Control-Allow-Headers', 'Content-Type, Content-Encoding, Authorization, X-Chunk-Index, X-File-Name, Prefer');
       
       if (req.method === 'OPTIONS') {
         res.writeHead(200);
@@ -275,227 +435,420 @@ class IndexedCPServer {
         return;
       }
 
-      // Public key endpoint (unauthenticated, encryption only)
-      if (this.encryption && req.method === 'GET' && req.url === '/public-key') {
-        this.handlePublicKeyRequest(req, res);
-        return;
-      }
+      const route = routes.get(`${req.method} ${req.url}`);
 
-      // Authenticate all other endpoints
-      const authHeader = req.headers['authorization'];
-      const providedApiKey = authHeader && authHeader.startsWith('Bearer ') 
-        ? authHeader.slice(7) 
-        : null;
-        
-      if (!providedApiKey || providedApiKey !== this.apiKey) {
+      // Authenticate everything but public routes (unknown URLs included)
+      if (!(route && route.public) && !this.isAuthorized(req.headers['authorization'])) {
         res.writeHead(401, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ error: 'Invalid or missing API key' }));
+        res.end(errorBody('Invalid or missing API key'));
         return;
       }
 
-      // Route requests
-      if (req.method === 'POST' && req.url === '/upload') {
-        this.handleUpload(req, res);
-      } else if (this.encryption && req.method === 'POST' && req.url === '/upload-encrypted') {
-        this.handleEncryptedUpload(req, res);
-      } else if (this.encryption && req.method === 'POST' && req.url === '/rotate-keys') {
-        this.handleKeyRotation(req, res);
-      } else {
+      if (!route) {
         res.writeHead(404);
         res.end('Not Found');
+        return;
       }
+      
+      route.handler.call(this, req, res);
     });
 
     return this.server;
   }
 
-  handleUpload(req, res) {
-    const chunkIndex = req.headers['x-chunk-index'];
-    const clientFileName = req.headers['x-file-name'] || 'uploaded_file.txt';
-    
-    let outputFile;
-    let actualFileName;
-    
-    // Handle different path modes
-    if (this.pathMode === 'ignore') {
-      // Mode: 'ignore' - Generate unique filename with full path preserved
-      const timestamp = Date.now();
-      const random = crypto.randomBytes(4).toString('hex');
-      
-      // Preserve full path by replacing separators with single underscore
-      // Strip leading ./ or .\
-      let fullPath = clientFileName.replace(/^\.\//, '').replace(/^\.\\/, '');
-      
-      // Replace path separators with single underscore
-      fullPath = fullPath.replace(/[/\\]+/g, '_');
-      
-      // Extract extension
-      const ext = path.extname(fullPath);
-      const nameWithoutExt = fullPath.slice(0, fullPath.length - ext.length);
-      
-      // Sanitize to be filesystem-safe:
-      // - Keep letters, numbers, underscores (path markers), dots, and existing dashes
-      // - Replace all other characters with dash
-      const safeName = nameWithoutExt.replace(/[^a-zA-Z0-9._-]/g, '-');
-      
-      // Format: <timestamp>_<random>_<full-path-with-underscores>.<ext>
-      let proposedName = `${timestamp}_${random}_${safeName}${ext}`;
-      
-      // Check filename length (most filesystems support 255 chars)
-      const MAX_FILENAME_LENGTH = 255;
-      if (proposedName.length > MAX_FILENAME_LENGTH) {
-        // Truncate the safe name part to fit
-        const prefixLength = `${timestamp}_${random}_`.length;
-        const maxSafeNameLength = MAX_FILENAME_LENGTH - prefixLength - ext.length;
-        const truncatedName = safeName.slice(0, maxSafeNameLength);
-        proposedName = `${timestamp}_${random}_${truncatedName}${ext}`;
-      }
-      
-      actualFileName = proposedName;
-      outputFile = path.join(this.outputDir, actualFileName);
-      
-    } else if (this.pathMode === 'allow-paths') {
-      // Mode: 'allow-paths' - Allow subdirectories from client
-      // Still protect against traversal attacks
-      const cleanedFileName = clientFileName.replace(/^\.\//, '').replace(/^\.\\/, '');
-      
-      // Reject traversal attempts and absolute paths
-      const hasTraversal = cleanedFileName.includes('..');
-      const hasAbsolutePath = cleanedFileName.startsWith('/') || 
-                             /^[A-Za-z]:/.test(cleanedFileName) ||
-                             cleanedFileName.startsWith('\\\\');
-      
-      if (hasTraversal || hasAbsolutePath) {
-        this.logger.error(`Security: Rejected filename with traversal/absolute path: ${clientFileName}`);
-        res.writeHead(400, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ 
-          error: 'Invalid filename',
-          message: 'Filename must not contain traversal sequences or absolute paths'
-        }));
-        return;
-      }
-      
-      // Allow paths but normalize separators
-      actualFileName = cleanedFileName.split(/[/\\]+/).join(path.sep);
-      outputFile = path.join(this.outputDir, actualFileName);
-      
-      // Security: Verify the resolved path is inside outputDir
-      const resolvedOutputFile = path.resolve(outputFile);
-      const resolvedOutputDir = path.resolve(this.outputDir);
-      if (!resolvedOutputFile.startsWith(resolvedOutputDir + path.sep) && 
-          resolvedOutputFile !== resolvedOutputDir) {
-        this.logger.error(`Security: Path traversal attempt blocked: ${clientFileName}`);
-        res.writeHead(403, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ error: 'Access denied: invalid path' }));
-        return;
-      }
-      
-      // Create subdirectories if needed
-      const outputFileDir = path.dirname(outputFile);
-      if (!fs.existsSync(outputFileDir)) {
-        fs.mkdirSync(outputFileDir, { recursive: true });
-      }
-      
-    } else {
-      // Mode: 'sanitize' (default) - Strip paths, prevent overwrites
-      
-      // Use custom generator if provided
-      if (this.filenameGenerator && typeof this.filenameGenerator === 'function') {
-        actualFileName = this.filenameGenerator(clientFileName, chunkIndex, req);
-      } else {
-        actualFileName = path.basename(clientFileName);
-      }
-      
-      // Strip common relative path prefixes
-      const cleanedFileName = clientFileName.replace(/^\.\//, '').replace(/^\.\\/, '');
-      
-      // Reject if filename contains path separators or traversal attempts  
-      const hasPathSeparators = cleanedFileName.includes('/') || 
-                                cleanedFileName.includes('\\');
-      const hasTraversal = clientFileName.includes('..');
-      const hasAbsolutePath = clientFileName.startsWith('/') || 
-                             /^[A-Za-z]:/.test(clientFileName) ||
-                             clientFileName.startsWith('\\\\');
-      
-      if (hasPathSeparators || hasTraversal || hasAbsolutePath) {
-        this.logger.error(`Security: Rejected filename with path components: ${clientFileName}`);
-        res.writeHead(400, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ 
-          error: 'Invalid filename',
-          message: 'Filename must not contain path separators or traversal sequences'
-        }));
-        return;
+  /**
+   * Get the cached append descriptor for an output file, opening it if
+   * needed. The first chunk of an upload always reopens, so a file removed or
+   * replaced since the last upload is not written through a stale descriptor.
+   * Pair every call with releaseOutputFile().
+   * @private
+   */
+  acquireOutputFile(outputFile, reopen) {
+    let entry = this.openFiles.get(outputFile);
+    if (entry) {
+      this.openFiles.delete(outputFile);
+      if (reopen) {
+        this.retireOutputFile(entry);
+        entry = null;
       }
-      
-      // Use only the basename to ensure we stay in outputDir
-      const safeName = path.basename(actualFileName);
-      
-      // Validate that we have a valid filename after sanitization
-      if (!safeName || safeName === '.' || safeName === '..' || safeName.length === 0) {
-        res.writeHead(400, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ error: 'Invalid filename' }));
-        return;
+    }
+    if (!entry) {
+      // A plain fd rather than a FileHandle: write streams over a FileHandle
+      // close it when they end, which would defeat the cache
+      const fd = new Promise((resolve, reject) => {
+        fs.open(outputFile, 'a', (error, fd) => error ? reject(error) : resolve(fd));
+      });
+      if (!this.cacheOutputFiles) {
+        // Never cached: closed by releaseOutputFile() once written
+        fd.catch(() => {});
+        return { fd, writers: 1, retired: true };
       }
-      
-      actualFileName = safeName;
-      
-      // Check if we have a session for this file
-      const isFirstChunk = !chunkIndex || chunkIndex === '0' || parseInt(chunkIndex) === 0;
-      
-      if (this.uploadSessions.has(clientFileName)) {
-        // Use the same filename from the first chunk
-        actualFileName = this.uploadSessions.get(clientFileName);
-      } else {
-        // First chunk - check for overwrites and create session
-        outputFile = path.join(this.outputDir, actualFileName);
-        
-        if (fs.existsSync(outputFile)) {
-          const ext = path.extname(actualFileName);
-          const base = path.basename(actualFileName, ext);
-          const timestamp = Date.now();
-          actualFileName = `${base}_${timestamp}${ext}`;
+      entry = { fd, writers: 0, retired: false };
+      // Failed opens are reported by the caller; just don't cache them
+      fd.catch(() => {
+        if (this.openFiles.get(outputFile) === entry) {
+          this.openFiles.delete(outputFile);
         }
-        
-        // Store the filename for subsequent chunks
-        this.uploadSessions.set(clientFileName, actualFileName);
-      }
-      
-      outputFile = path.join(this.outputDir, actualFileName);
-      
-      // Security: Verify the resolved path is inside outputDir
-      const resolvedOutputFile = path.resolve(outputFile);
-      const resolvedOutputDir = path.resolve(this.outputDir);
-      if (!resolvedOutputFile.startsWith(resolvedOutputDir + path.sep) && 
-          resolvedOutputFile !== resolvedOutputDir) {
-        this.logger.error(`Security: Path traversal attempt blocked: ${clientFileName}`);
-        res.writeHead(403, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ error: 'Access denied: invalid path' }));
-        return;
+      });
+    }
+    entry.writers++;
+    this.openFiles.set(outputFile, entry);
+    
+    // Evict idle descriptors beyond the limit; busy ones close on release
+    for (const [file, cached] of this.openFiles) {
+      if (this.openFiles.size <= this.maxOpenFiles) break;
+      if (cached.writers === 0) {
+        this.openFiles.delete(file);
+        this.retireOutputFile(cached);
       }
     }
+    return entry;
+  }
+
+  /**
+   * @private
+   */
+  releaseOutputFile(entry) {
+    entry.writers--;
+    if (entry.retired && entry.writers === 0) {
+      this.closeOutputFile(entry);
+    }
+  }
+
+  /**
+   * Mark a descriptor as no longer cached and close it once its writers finish
+   * @private
+   */
+  retireOutputFile(entry) {
+    entry.retired = true;
+    if (entry.writers === 0) {
+      this.closeOutputFile(entry);
+    }
+  }
+
+  /**
+   * @private
+   */
+  closeOutputFile(entry) {
+    entry.fd.then((fd) => {
+      fs.close(fd, (error) => {
+        if (error) this.logger.warn('Failed to close output file:', error.message);
+      });
+    }, () => {});
+  }
+
+  /**
+   * Whether a path resolves to outputDir or somewhere below it
+   * @private
+   */
+  isInsideOutputDir(file) {
+    const resolved = path.resolve(file);
+    return resolved.startsWith(this.outputDirPrefix) || resolved === this.resolvedOutputDir;
+  }
+
+  /**
+   * Look up an upload session's filename, marking it recently used
+   * @private
+   * @returns {string|undefined}
+   */
+  getUploadSession(key) {
+    const fileName = this.uploadSessions.get(key);
+    if (fileName !== undefined) {
+      this.uploadSessionAccess.delete(key);
+      this.uploadSessionAccess.set(key, Date.now());
+    }
+    return fileName;
+  }
+
+  /**
+   * Record an upload session, evicting the least recently used beyond the cap
+   * @private
+   */
+  setUploadSession(key, fileName) {
+    this.uploadSessions.set(key, fileName);
+    this.uploadSessionAccess.delete(key);
+    this.uploadSessionAccess.set(key, Date.now());
+    if (this.uploadSessionAccess.size > this.maxUploadSessions) {
+      this.evictUploadSession(this.uploadSessionAccess.keys().next().value);
+    }
+  }
+
+  /**
+   * Drop sessions idle for longer than uploadSessionTTL
+   * @private
+   */
+  reapUploadSessions(now = Date.now()) {
+    for (const [key, lastAccess] of this.uploadSessionAccess) {
+      // Map order is access order, so the remaining sessions are newer
+      if (now - lastAccess < this.uploadSessionTTL) break;
+      this.evictUploadSession(key);
+    }
+  }
+
+  /**
+   * @private
+   */
+  evictUploadSession(key) {
+    const fileName = this.uploadSessions.get(key);
+    this.uploadSessions.delete(key);
+    this.uploadSessionAccess.delete(key);
+    this.evictedUploadSessions++;
+    
+    // Its output file is done with too, unless a write is still in flight
+    const outputFile = this.outputDirPrefix + fileName;
+    const entry = this.openFiles.get(outputFile);
+    if (entry && entry.writers === 0) {
+      this.openFiles.delete(outputFile);
+      this.retireOutputFile(entry);
+    }
+    this.logger.debug(`Evicted upload session ${key}`);
+  }
+
+  /**
+   * Get upload session statistics
+   */
+  getUploadSessionStats() {
+    return {
+      activeUploadSessions: this.uploadSessions.size,
+      evictedUploadSessions: this.evictedUploadSessions
+    };
+  }
+
+  /**
+   * Flush an output file to stable storage (group commit). Callers arriving
+   * before the scheduled fsync starts share it; callers arriving after it
+   * started wait for the next one, which covers their writes.
+   * @param {string} outputFile
+   * @returns {Promise<void>}
+   */
+  commit(outputFile) {
+    let pending = this.pendingSyncs.get(outputFile);
+    if (!pending) {
+      pending = new Promise((resolve, reject) => {
+        setTimeout(() => {
+          this.pendingSyncs.delete(outputFile);
+          const entry = this.acquireOutputFile(outputFile, false);
+          entry.fd
+            .then(fd => new Promise((done, fail) => {
+              fs.fsync(fd, error => error ? fail(error) : done());
+            }))
+            .finally(() => this.releaseOutputFile(entry))
+            .then(resolve, reject);
+        }, this.syncInterval);
+      });
+      this.pendingSyncs.set(outputFile, pending);
+    }
+    return pending;
+  }
+
+  /**
+   * Create a directory (and parents) if missing, answering 500 on failure
+   * @private
+   * @returns {Promise<boolean>} Whether the directory is usable
+   */
+  async ensureDirectory(dir, res) {
+    try {
+      await fs.promises.mkdir(dir, { recursive: true });
+      return true;
+    } catch (error) {
+      this.logger.error('Write error:', error);
+      res.writeHead(500, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({ error: 'Write error', message: error.message }));
+      return false;
+    }
+  }
+
+  /**
+   * Output path for 'ignore' mode: unique flat filename with the client path folded in
+   * @private
+   * @returns {Promise<{outputFile: string, actualFileName: string}|null>}
+   *   null when the request was rejected (the response is already sent)
+   */
+  async resolveIgnoreModePath(req, res, clientFileName, chunkIndex) {
+    // Mode: 'ignore' - Generate unique filename with full path preserved
+    const timestamp = Date.now();
+    const random = randomFileTag();
+    
+    // Preserve full path by replacing separators with single underscore
+    // Strip leading ./ or .\
+    let fullPath = clientFileName.replace(LEADING_RELATIVE_PREFIX, '');
+    
+    // Replace path separators with single underscore
+    fullPath = fullPath.replace(PATH_SEPARATORS, '_');
     
-    // Ensure output directory exists
-    if (!fs.existsSync(this.outputDir)) {
-      fs.mkdirSync(this.outputDir, { recursive: true });
+    // Extract extension
+    const ext = path.extname(fullPath);
+    const nameWithoutExt = fullPath.slice(0, fullPath.length - ext.length);
+    
+    // Sanitize to be filesystem-safe:
+    // - Keep letters, numbers, underscores (path markers), dots, and existing dashes
+    // - Replace all other characters with dash
+    const safeName = nameWithoutExt.replace(UNSAFE_FILENAME_CHARS, '-');
+    
+    // Format: <timestamp>_<random>_<full-path-with-underscores>.<ext>
+    let proposedName = `${timestamp}_${random}_${safeName}${ext}`;
+    
+    // Check filename length
+    if (proposedName.length > MAX_FILENAME_LENGTH) {
+      // Truncate the safe name part to fit
+      const prefixLength = `${timestamp}_${random}_`.length;
+      const maxSafeNameLength = MAX_FILENAME_LENGTH - prefixLength - ext.length;
+      const truncatedName = safeName.slice(0, maxSafeNameLength);
+      proposedName = `${timestamp}_${random}_${truncatedName}${ext}`;
     }
     
-    const writeStream = fs.createWriteStream(outputFile, { flags: 'a' });
+    const actualFileName = proposedName;
+    const outputFile = this.outputDirPrefix + actualFileName;
+    return { outputFile, actualFileName };
+  }
+
+  /**
+   * Output path for 'allow-paths' mode: client subdirectories, no traversal
+   * @private
+   * @returns {Promise<{outputFile: string, actualFileName: string}|null>}
+   *   null when the request was rejected (the response is already sent)
+   */
+  async resolveAllowPathsModePath(req, res, clientFileName, chunkIndex) {
+    // Mode: 'allow-paths' - Allow subdirectories from client
+    // Still protect against traversal attacks
+    const cleanedFileName = clientFileName.replace(LEADING_RELATIVE_PREFIX, '');
     
-    req.pipe(writeStream);
+    // Reject traversal attempts and absolute paths
+    const hasTraversal = cleanedFileName.includes('..');
+    const hasAbsolutePath = cleanedFileName.startsWith('/') || 
+                           /^[A-Za-z]:/.test(cleanedFileName) ||
+                           cleanedFileName.startsWith('\\\\');
     
-    req.on('end', () => {
-      this.logger.info(`Chunk ${chunkIndex} received for ${clientFileName} -> ${actualFileName}`);
-      
-      // Return response with actual filename used
-      res.writeHead(200, { 'Content-Type': 'application/json' });
+    if (hasTraversal || hasAbsolutePath) {
+      this.logger.error(`Security: Rejected filename with traversal/absolute path: ${clientFileName}`);
+      res.writeHead(400, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({ 
+        error: 'Invalid filename',
+        message: 'Filename must not contain traversal sequences or absolute paths'
+      }));
+      return null;
+    }
+    
+    // Allow paths but normalize separators
+    const actualFileName = cleanedFileName.split(PATH_SEPARATORS).join(path.sep);
+    const outputFile = path.join(this.outputDir, actualFileName);
+    
+    // Security: Verify the resolved path is inside outputDir
+    if (!this.isInsideOutputDir(outputFile)) {
+      this.logger.error(`Security: Path traversal attempt blocked: ${clientFileName}`);
+      res.writeHead(403, { 'Content-Type': 'application/json' });
+      res.end(errorBody('Access denied: invalid path'));
+      return null;
+    }
+    
+    // Create subdirectories if needed
+    if (!await this.ensureDirectory(path.dirname(outputFile), res)) {
+      return null;
+    }
+    
+    return { outputFile, actualFileName };
+  }
+
+  /**
+   * Output path for 'sanitize' mode: basename only, never overwriting
+   * @private
+   * @returns {Promise<{outputFile: string, actualFileName: string}|null>}
+   *   null when the request was rejected (the response is already sent)
+   */
+  async resolveSanitizeModePath(req, res, clientFileName, chunkIndex) {
+    // Later chunks reuse the filename chosen and validated for the first one
+    const sessionFileName = this.getUploadSession(clientFileName);
+    if (sessionFileName !== undefined) {
+      return {
+        outputFile: this.outputDirPrefix + sessionFileName,
+        actualFileName: sessionFileName
+      };
+    }
+    
+    // A later chunk whose session was evicted cannot tell which file it
+    // continues; naming it as a new upload would split the file in two
+    if (parseInt(chunkIndex) > 0) {
+      this.logger.warn(`Rejected chunk ${chunkIndex} of ${clientFileName}: upload session expired`);
+      res.writeHead(409, { 'Content-Type': 'application/json' });
       res.end(JSON.stringify({
-        message: 'Chunk received',
-        actualFilename: actualFileName,
-        chunkIndex: parseInt(chunkIndex),
-        clientFilename: clientFileName
+        error: 'Upload session expired',
+        message: 'No upload session for this file; restart the upload from chunk 0'
       }));
-    });
+      return null;
+    }
+    
+    let actualFileName;
+    
+    // Use custom generator if provided
+    if (this.filenameGenerator && typeof this.filenameGenerator === 'function') {
+      actualFileName = this.filenameGenerator(clientFileName, chunkIndex, req);
+    } else {
+      actualFileName = path.basename(clientFileName);
+    }
+    
+    // Strip common relative path prefixes
+    const cleanedFileName = clientFileName.replace(LEADING_RELATIVE_PREFIX, '');
+    
+    // Reject if filename contains path separators or traversal attempts  
+    const hasPathSeparators = cleanedFileName.includes('/') || 
+                              cleanedFileName.includes('\\');
+    const hasTraversal = clientFileName.includes('..');
+    const hasAbsolutePath = clientFileName.startsWith('/') || 
+                           /^[A-Za-z]:/.test(clientFileName) ||
+                           clientFileName.startsWith('\\\\');
+    
+    if (hasPathSeparators || hasTraversal || hasAbsolutePath) {
+      this.logger.error(`Security: Rejected filename with path components: ${clientFileName}`);
+      res.writeHead(400, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({ 
+        error: 'Invalid filename',
+        message: 'Filename must not contain path separators or traversal sequences'
+      }));
+      return null;
+    }
+    
+    // Use only the basename to ensure we stay in outputDir
+    const safeName = path.basename(actualFileName);
+    
+    // Validate that we have a valid filename after sanitization
+    if (!safeName || safeName === '.' || safeName === '..' || safeName.length === 0) {
+      res.writeHead(400, { 'Content-Type': 'application/json' });
+      res.end(errorBody('Invalid filename'));
+      return null;
+    }
+    
+    actualFileName = safeName;
+    
+    // First chunk - check for overwrites
+    if (await pathExists(this.outputDirPrefix + actualFileName)) {
+      const ext = path.extname(actualFileName);
+      const base = path.basename(actualFileName, ext);
+      const timestamp = Date.now();
+      actualFileName = `${base}_${timestamp}${ext}`;
+    }
+    
+    const outputFile = this.outputDirPrefix + actualFileName;
+    
+    // Security: Verify the resolved path is inside outputDir
+    if (!this.isInsideOutputDir(outputFile)) {
+      this.logger.error(`Security: Path traversal attempt blocked: ${clientFileName}`);
+      res.writeHead(403, { 'Content-Type': 'application/json' });
+      res.end(errorBody('Access denied: invalid path'));
+      return null;
+    }
+    
+    // Store the filename for subsequent chunks
+    this.setUploadSession(clientFileName, actualFileName);
+    
+    return { outputFile, actualFileName };
+  }
 
+  async handleUpload(req, res) {
+    const chunkIndex = req.headers['x-chunk-index'];
+    const chunkNumber = parseInt(chunkIndex);
+    const clientFileName = req.headers['x-file-name'] || 'uploaded_file.txt';
+    
+    // Registered first: the body may error while we await the filesystem
     req.on('error', (error) => {
       this.logger.error('Upload error:', error);
       if (!res.headersSent) {
@@ -503,14 +856,104 @@ class IndexedCPServer {
         res.end(JSON.stringify({ error: 'Upload error', message: error.message }));
       }
     });
-
-    writeStream.on('error', (error) => {
+    
+    const target = await this.resolveOutputPath(req, res, clientFileName, chunkIndex);
+    if (!target) {
+      return;
+    }
+    const { outputFile, actualFileName } = target;
+    
+    // Compressed chunks are decoded before they are appended
+    let body = req;
+    const contentEncoding = req.headers['content-encoding'];
+    if (contentEncoding && contentEncoding !== 'identity') {
+      const decoder = createDecoder(contentEncoding);
+      if (!decoder) {
+        res.writeHead(415, { 'Content-Type': 'application/json' });
+        res.end(JSON.stringify({ error: `Unsupported Content-Encoding: ${contentEncoding}` }));
+        return;
+      }
+      decoder.on('error', (error) => {
+        this.logger.error('Decompression error:', error);
+        if (!res.headersSent) {
+          res.writeHead(400, { 'Content-Type': 'application/json' });
+          res.end(JSON.stringify({ error: 'Invalid compressed body', message: error.message }));
+        }
+      });
+      body = req.pipe(decoder);
+    }
+    
+    // Ensure output directory exists. A continuation chunk whose fd is
+    // cached skips this: the directory existed when that fd was opened.
+    const isNewUpload = !chunkIndex || chunkNumber === 0;
+    if (this.uploadDir && (isNewUpload || !this.openFiles.has(outputFile)) &&
+        !await this.ensureDirectory(this.uploadDir, res)) {
+      return;
+    }
+    
+    const outputEntry = this.acquireOutputFile(outputFile, isNewUpload);
+    let released = false;
+    const release = () => {
+      if (!released) {
+        released = true;
+        this.releaseOutputFile(outputEntry);
+      }
+    };
+    // Covers aborted requests and decode errors, where 'finish' never comes
+    res.on('close', release);
+    
+    const writeFailed = (error) => {
+      release();
       this.logger.error('Write error:', error);
       if (!res.headersSent) {
         res.writeHead(500, { 'Content-Type': 'application/json' });
         res.end(JSON.stringify({ error: 'Write error', message: error.message }));
       }
-    });
+    };
+    
+    outputEntry.fd.then((fd) => {
+      const writeStream = fs.createWriteStream(null, {
+        fd,
+        autoClose: false,
+        highWaterMark: this.writeBufferSize
+      });
+      body.pipe(writeStream);
+      
+      // Answer once the chunk is written, not merely received
+      writeStream.on('finish', () => {
+        release();
+        if (!this.syncWrites) {
+          respond(writeStream.bytesWritten);
+          return;
+        }
+        this.commit(outputFile).then(() => respond(writeStream.bytesWritten), writeFailed);
+      });
+      
+      writeStream.on('error', writeFailed);
+    }, writeFailed);
+    
+    const respond = (bytesReceived) => {
+      if (res.headersSent) return;
+      this.logger.debug(`Chunk ${chunkIndex} received for ${clientFileName} -> ${actualFileName}`);
+      
+      // Clients that do not need the body (every chunk after the first) ask
+      // for an empty 204 with "Prefer: return=minimal" (RFC 7240)
+      if (/\breturn=minimal\b/.test(req.headers['prefer'] || '')) {
+        res.writeHead(204, { 'Preference-Applied': 'return=minimal' });
+        res.end();
+        return;
+      }
+      
+      // Return response with actual filename used
+      res.writeHead(200, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({
+        message: 'Chunk received',
+        actualFilename: actualFileName,
+        chunkIndex: chunkNumber,
+        clientFilename: clientFileName,
+        bytesReceived
+      }));
+    };
   }
 
   // ============================================================================
@@ -524,7 +967,8 @@ class IndexedCPServer {
     try {
       const publicKeyInfo = this.getActivePublicKey();
       res.writeHead(200, { 'Content-Type': 'application/json' });
-      res.end(JSON.stringify(publicKeyInfo));
+      // Clients only send binary AAD to servers listing it here
+      res.end(JSON.stringify({ ...publicKeyInfo, aadFormats: this.cryptoUtils.AAD_FORMATS }));
     } catch (error) {
       res.writeHead(500, { 'Content-Type': 'application/json' });
       res.end(JSON.stringify({ error: error.message }));
@@ -552,21 +996,23 @@ class IndexedCPServer {
    * Handle encrypted packet upload
    */
   async handleEncryptedUpload(req, res) {
-    let body = '';
+    // Collect raw Buffers and decode once: no per-chunk string copies, and
+    // no multi-byte characters split across chunk boundaries
+    const parts = [];
     
     req.on('data', chunk => {
-      body += chunk.toString();
+      parts.push(chunk);
     });
     
     req.on('end', async () => {
       try {
-        const packet = JSON.parse(body);
+        const packet = JSON.parse(Buffer.concat(parts).toString());
         
         // Validate packet structure
         if (!packet.sessionId || !packet.kid || !packet.wrappedKey || 
             !packet.ciphertext || !packet.iv || !packet.authTag || !packet.aad) {
           res.writeHead(400, { 'Content-Type': 'application/json' });
-          res.end(JSON.stringify({ error: 'Invalid packet structure' }));
+          res.end(errorBody('Invalid packet structure'));
           return;
         }
         
@@ -587,17 +1033,14 @@ class IndexedCPServer {
         }
         
         // Decrypt packet
-        const ciphertextBuffer = Buffer.from(packet.ciphertext, 'base64');
-        const ivBuffer = Buffer.from(packet.iv, 'base64');
-        const authTagBuffer = Buffer.from(packet.authTag, 'base64');
-        const aadBuffer = Buffer.from(packet.aad, 'base64');
+        const { ciphertext, iv, authTag, aad } = this.cryptoUtils.deserializePacket(packet);
         
         const plaintext = await this.cryptoUtils.decryptPacket(
-          ciphertextBuffer,
+          ciphertext,
           sessionKey,
-          ivBuffer,
-          authTagBuffer,
-          aadBuffer
+          iv,
+          authTag,
+          aad
         );
         
         // Generate filename for this packet
@@ -623,33 +1066,29 @@ class IndexedCPServer {
         };
         
         // Ensure output directory exists
-        if (!fs.existsSync(this.outputDir)) {
-          fs.mkdirSync(this.outputDir, { recursive: true });
-        }
+        await fs.promises.mkdir(this.outputDir, { recursive: true });
         
         // Generate output filename
-        let actualFileName;
         const sessionCacheKey = `session:${packet.sessionId}`;
+        let actualFileName = this.getUploadSession(sessionCacheKey);
         
-        if (this.uploadSessions.has(sessionCacheKey)) {
-          actualFileName = this.uploadSessions.get(sessionCacheKey);
-        } else {
+        if (actualFileName === undefined) {
           const timestamp = Date.now();
-          const random = crypto.randomBytes(4).toString('hex');
+          const random = randomFileTag();
           const ext = path.extname(fileName);
           const baseName = path.basename(fileName, ext);
           actualFileName = `${timestamp}_${random}_${baseName}${ext}`;
-          this.uploadSessions.set(sessionCacheKey, actualFileName);
+          this.setUploadSession(sessionCacheKey, actualFileName);
         }
         
-        const outputFile = path.join(this.outputDir, actualFileName);
+        const outputFile = this.outputDirPrefix + actualFileName;
         const writeStream = fs.createWriteStream(outputFile, { flags: 'a' });
         
         writeStream.write(plaintext);
         writeStream.end();
         
         writeStream.on('finish', () => {
-          this.logger.info(`✓ Decrypted and saved packet ${packet.seq} for session ${packet.sessionId}`);
+          this.logger.debug(`✓ Decrypted and saved packet ${packet.seq} for session ${packet.sessionId}`);
           res.writeHead(200, { 'Content-Type': 'application/json' });
           res.end(JSON.stringify({
             message: 'Packet decrypted and saved',
@@ -704,23 +1143,37 @@ class IndexedCPServer {
       this.createServer();
     }
     
-    this.server.listen(serverPort, () => {
-      this.logger.info(`Server listening on http://localhost:${serverPort}`);
-      this.logger.info(`API Key: ${this.apiKey}`);
+    if (!this.sessionReaper) {
+      this.sessionReaper = setInterval(() => this.reapUploadSessions(), 60 * 1000);
+      this.sessionReaper.unref();
+    }
+    
+    // Resolves once the socket is bound, so `await server.listen()` is a
+    // readiness signal and callers need no start-up delay
+    await new Promise((resolve, reject) => {
+      this.server.once('error', reject);
+      this.server.listen(serverPort, () => {
+        this.server.off('error', reject);
+        this.logger.info(`Server listening on http://localhost:${serverPort}`);
+        this.logger.info(`API Key: ${this.apiKey}`);
       
-      if (this.encryption) {
-        this.logger.info(`Active Key ID: ${this.activeKeyId}`);
-        this.logger.info('Endpoints:');
-        this.logger.info('  GET  /public-key        - Fetch server public key');
-        this.logger.info('  POST /upload-encrypted  - Upload encrypted packets');
-        this.logger.info('  POST /upload            - Legacy unencrypted upload');
-        this.logger.info('  POST /rotate-keys       - Rotate encryption keys');
-      } else {
-        this.logger.info('Endpoints:');
-        this.logger.info('  POST /upload            - Upload files');
-      }
+        if (this.encryption) {
+          this.logger.info(`Active Key ID: ${this.activeKeyId}`);
+          this.logger.info('Endpoints:');
+          this.logger.info('  GET  /health            - Health check');
+          this.logger.info('  GET  /public-key        - Fetch server public key');
+          this.logger.info('  POST /upload-encrypted  - Upload encrypted packets');
+          this.logger.info('  POST /upload            - Legacy unencrypted upload');
+          this.logger.info('  POST /rotate-keys       - Rotate encryption keys');
+        } else {
+          this.logger.info('Endpoints:');
+          this.logger.info('  GET  /health            - Health check');
+          this.logger.info('  POST /upload            - Upload files');
+        }
       
-      if (callback) callback();
+        if (callback) callback();
+        resolve();
+      });
     });
   }
 
@@ -729,11 +1182,21 @@ class IndexedCPServer {
       this.server.close();
     }
     
+    if (this.sessionReaper) {
+      clearInterval(this.sessionReaper);
+      this.sessionReaper = null;
+    }
+    
     // Close keystore connection if encryption enabled
     if (this.encryption && this.keyStore) {
       this.keyStore.close();
     }
     
+    for (const entry of this.openFiles.values()) {
+      this.retireOutputFile(entry);
+    }
+    this.openFiles.clear();
+    
     // Clear sensitive data
     if (this.encryption) {
       this.keyPairs.clear();
@@ -7,6 +7,8 @@ process.env.INDEXEDCP_TEST_MODE = 'true';
 
 const path = require('path');
 const fs = require('fs');
+const http = require('http');
+const os = require('os');
 const { IndexedCPServer } = require('../server');
 const IndexedCPClient = require('../client');
 
@@ -69,13 +71,48 @@ function verifyUpload(filename, originalContent) {
   if (!fs.existsSync(uploadedPath)) {
     throw new Error(`File not found: ${uploadedPath}`);
   }
-  const uploadedContent = fs.readFileSync(uploadedPath, 'utf-8');
-  if (uploadedContent !== originalContent) {
+  // Compared as bytes: no decode of the uploaded file into a string
+  const expected = Buffer.isBuffer(originalContent) ? originalContent : Buffer.from(originalContent);
+  if (!fs.readFileSync(uploadedPath).equals(expected)) {
     throw new Error('Content mismatch!');
   }
   logSuccess(`File verified: ${filename}`);
 }
 
+// Send one chunk with raw headers; resolves with the status and body text
+function postChunk(port, body, headers) {
+  return new Promise((resolve, reject) => {
+    const req = http.request({
+      port,
+      method: 'POST',
+      path: '/upload',
+      headers: { 'Authorization': `Bearer ${API_KEY}`, 'X-Chunk-Index': '0', ...headers }
+    }, (res) => {
+      const parts = [];
+      res.on('data', part => parts.push(part));
+      res.on('end', () => resolve({ status: res.statusCode, body: Buffer.concat(parts).toString() }));
+    });
+    req.on('error', reject);
+    req.end(body);
+  });
+}
+
+// Run fn against an extra server with its own options and output directory.
+// Each gets a fresh port, so no pooled keep-alive socket points at a closed one.
+let nextExtraPort = TEST_PORT + 10;
+async function withServer(options, fn) {
+  const port = nextExtraPort++;
+  const outputDir = fs.mkdtempSync(path.join(os.tmpdir(), 'indexcp-server-'));
+  const extra = new IndexedCPServer({ port, outputDir, apiKey: API_KEY, pathMode: 'sanitize', ...options });
+  await extra.listen(port);
+  try {
+    await fn(extra, port, outputDir);
+  } finally {
+    extra.close();
+    fs.rmSync(outputDir, { recursive: true, force: true });
+  }
+}
+
 // Test 1: Basic client upload
 async function testBasicClientUpload(server) {
   logTest('Basic Client Upload');
@@ -187,7 +224,7 @@ async function testLargeFileUpload(server) {
   try {
     // Create a large test file
     logInfo(`Creating ${chunks}MB test file...`);
-    const content = 'X'.repeat(chunkSize).repeat(chunks);
+    const content = Buffer.alloc(chunkSize * chunks, 'X');
     fs.writeFileSync(largeFile, content);
     
     const client = new IndexedCPClient({
@@ -304,6 +341,351 @@ async function testResumeUpload(server) {
   }
 }
 
+// Test 8: Compressed chunks are decoded by the server
+async function testCompressedUpload(server) {
+  logTest('Compressed Chunk Upload');
+  
+  const testFile = './test-compressed-file.txt';
+  const content = 'Compressible line of text\n'.repeat(5000);
+  
+  try {
+    fs.writeFileSync(testFile, content);
+    
+    const client = new IndexedCPClient({
+      apiKey: API_KEY,
+      chunkSize: 16 * 1024,
+      compression: 'gzip'
+    });
+    
+    logInfo('Adding file to buffer with compression...');
+    await client.addFile(testFile);
+    
+    logInfo('Uploading compressed chunks...');
+    const result = await client.uploadBufferedFiles(`http://localhost:${TEST_PORT}/upload`);
+    
+    verifyUpload(result[testFile] || 'test-compressed-file.txt', content);
+    
+    logInfo('Uploading directly with compression...');
+    fs.unlinkSync(path.join(UPLOAD_DIR, result[testFile] || 'test-compressed-file.txt'));
+    await client.bufferAndUpload(testFile, `http://localhost:${TEST_PORT}/upload`);
+    verifyUpload('test-compressed-file.txt', content);
+  } finally {
+    if (fs.existsSync(testFile)) {
+      fs.unlinkSync(testFile);
+    }
+  }
+}
+
+// Test 9: Chunks past the first request an empty response
+async function testMinimalResponse(server) {
+  logTest('Minimal Chunk Response');
+  
+  const client = new IndexedCPClient({ apiKey: API_KEY });
+  const url = `http://localhost:${TEST_PORT}/upload`;
+  
+  const first = await client.uploadChunk(url, Buffer.from('first '), 0, 'minimal.txt', API_KEY);
+  if (first.status !== 200 || !first.data || !first.data.actualFilename) {
+    throw new Error(`Expected JSON response for first chunk, got ${first.status}`);
+  }
+  logSuccess(`First chunk answered with actualFilename: ${first.data.actualFilename}`);
+  
+  const next = await client.uploadChunk(url, Buffer.from('second'), 1, 'minimal.txt', API_KEY, false);
+  if (next.status !== 204) {
+    throw new Error(`Expected 204 for Prefer: return=minimal, got ${next.status}`);
+  }
+  logSuccess('Later chunk answered with 204 No Content');
+  
+  verifyUpload(first.data.actualFilename, 'first second');
+}
+
+// Test 10: A later chunk whose upload session was evicted is rejected
+async function testEvictedSession(server) {
+  logTest('Evicted Upload Session');
+  
+  const client = new IndexedCPClient({ apiKey: API_KEY });
+  const url = `http://localhost:${TEST_PORT}/upload`;
+  
+  const first = await client.uploadChunk(url, Buffer.from('first '), 0, 'evicted.txt', API_KEY);
+  
+  // Age every session past the TTL
+  server.reapUploadSessions(Date.now() + server.uploadSessionTTL);
+  if (server.getUploadSessionStats().activeUploadSessions !== 0) {
+    throw new Error('Upload session was not evicted');
+  }
+  
+  try {
+    await client.uploadChunk(url, Buffer.from('second'), 1, 'evicted.txt', API_KEY);
+    throw new Error('Continuation chunk was accepted without a session');
+  } catch (error) {
+    if (!error.message.includes('Conflict')) {
+      throw error;
+    }
+  }
+  logSuccess('Continuation chunk rejected with 409');
+  
+  // Nothing was split off into a second file
+  const files = fs.readdirSync(UPLOAD_DIR);
+  if (files.length !== 1) {
+    throw new Error(`Expected only ${first.data.actualFilename}, found: ${files.join(', ')}`);
+  }
+  verifyUpload(first.data.actualFilename, 'first ');
+  
+  // A background upload whose session is lost part-way gives up on the rest
+  const testFile = './test-evicted-file.txt';
+  try {
+    fs.writeFileSync(testFile, 'Evicted session content\n'.repeat(200));
+    const progress = [];
+    const evictedClient = new IndexedCPClient({
+      apiKey: API_KEY,
+      dbName: 'test-evicted',
+      chunkSize: 1024,
+      onUploadProgress: (info) => {
+        progress.push(info);
+        // Lose the session after the first chunk, as a server restart would
+        if (info.status === 'success' && info.chunkIndex === 0) {
+          server.reapUploadSessions(Date.now() + server.uploadSessionTTL);
+        }
+      }
+    });
+    await evictedClient.addFile(testFile);
+    await evictedClient._processBackgroundUpload(url);
+    
+    const failed = progress.filter(info => info.status === 'failed');
+    if (failed.length !== 4 || !failed.every(info => info.permanent)) {
+      throw new Error(`Expected 4 permanent failures, got: ${JSON.stringify(failed)}`);
+    }
+    logSuccess('Chunks after the lost session failed permanently');
+    
+    // Later passes send nothing; the chunks stay buffered for inspection
+    progress.length = 0;
+    await evictedClient._processBackgroundUpload(url);
+    const db = await evictedClient.initDB();
+    const buffered = await db.count(evictedClient.storeName);
+    if (progress.length !== 0 || buffered !== 4) {
+      throw new Error(`Expected no retries and 4 buffered chunks, got ${progress.length} attempts and ${buffered} chunks`);
+    }
+    logSuccess('Permanently failed chunks are not retried');
+  } finally {
+    if (fs.existsSync(testFile)) {
+      fs.unlinkSync(testFile);
+    }
+  }
+}
+
+// Test 11: Chunks buffered as file descriptors are re-read safely
+async function testBufferedDescriptors(server) {
+  logTest('Buffered Descriptor Upload');
+  
+  const testFile = './test-descriptor-file.txt';
+  const content = 'Descriptor chunk content\n'.repeat(200);
+  const elsewhere = fs.mkdtempSync(path.join(os.tmpdir(), 'indexcp-cwd-'));
+  const cwd = process.cwd();
+  
+  try {
+    fs.writeFileSync(testFile, content);
+    const client = new IndexedCPClient({
+      apiKey: API_KEY,
+      dbName: 'test-descriptors',
+      chunkSize: 1024
+    });
+    
+    // Nothing listens on this port, so every chunk is buffered as a descriptor
+    const downUrl = `http://localhost:${TEST_PORT + 1}/upload`;
+    await client.bufferAndUpload(testFile, downUrl).catch(() => {});
+    
+    // The relative path no longer resolves from here
+    process.chdir(elsewhere);
+    let result;
+    try {
+      result = await client.uploadBufferedFiles(`http://localhost:${TEST_PORT}/upload`);
+    } finally {
+      process.chdir(cwd);
+    }
+    verifyUpload(result[testFile], content);
+    logSuccess('Descriptors re-read from another working directory');
+    
+    // A source file changed after buffering fails instead of sending short chunks
+    await client.bufferAndUpload(testFile, downUrl).catch(() => {});
+    fs.truncateSync(testFile, 100);
+    try {
+      await client.uploadBufferedFiles(`http://localhost:${TEST_PORT}/upload`);
+      throw new Error('Upload of a changed source file succeeded');
+    } catch (error) {
+      if (!error.message.includes('changed since')) {
+        throw error;
+      }
+    }
+    logSuccess('Changed source file rejected');
+    
+    // The background pass gives up on those chunks instead of backing off
+    const progress = [];
+    client.onUploadProgress = (info) => progress.push(info);
+    await client._processBackgroundUpload(`http://localhost:${TEST_PORT}/upload`);
+    if (progress.length === 0 || !progress.every(info => info.status === 'failed' && info.permanent)) {
+      throw new Error(`Expected permanent failures, got: ${JSON.stringify(progress)}`);
+    }
+    progress.length = 0;
+    await client._processBackgroundUpload(`http://localhost:${TEST_PORT}/upload`);
+    if (progress.length !== 0) {
+      throw new Error(`Changed source file retried: ${JSON.stringify(progress)}`);
+    }
+    logSuccess('Changed source file not retried');
+  } finally {
+    fs.rmSync(elsewhere, { recursive: true, force: true });
+    if (fs.existsSync(testFile)) {
+      fs.unlinkSync(testFile);
+    }
+  }
+}
+
+// Test 12: Unsupported and corrupt Content-Encoding are rejected
+async function testContentEncodingErrors(server) {
+  logTest('Content-Encoding Errors');
+  
+  const unsupported = await postChunk(TEST_PORT, Buffer.from('data'), {
+    'X-File-Name': 'encoding-unsupported.txt',
+    'Content-Encoding': 'x-unknown'
+  });
+  if (unsupported.status !== 415) {
+    throw new Error(`Expected 415 for an unknown encoding, got ${unsupported.status}`);
+  }
+  logSuccess('Unknown Content-Encoding answered with 415');
+  
+  const corrupt = await postChunk(TEST_PORT, Buffer.from('definitely not gzip'), {
+    'X-File-Name': 'encoding-corrupt.txt',
+    'Content-Encoding': 'gzip'
+  });
+  if (corrupt.status !== 400) {
+    throw new Error(`Expected 400 for a corrupt gzip body, got ${corrupt.status}`);
+  }
+  logSuccess('Corrupt gzip body answered with 400');
+}
+
+// Test 13: syncWrites uploads are fsynced before being acknowledged
+async function testSyncWrites() {
+  logTest('Synchronous Writes (Group Commit)');
+  
+  await withServer({ syncWrites: true }, async (syncServer, port, outputDir) => {
+    let commits = 0;
+    const commit = syncServer.commit;
+    syncServer.commit = function (...args) {
+      commits++;
+      return commit.apply(this, args);
+    };
+    
+    const client = new IndexedCPClient({ apiKey: API_KEY });
+    const url = `http://localhost:${port}/upload`;
+    const parts = ['first ', 'second ', 'third'];
+    let actualFilename;
+    for (let i = 0; i < parts.length; i++) {
+      const response = await client.uploadChunk(url, Buffer.from(parts[i]), i, 'synced.txt', API_KEY);
+      actualFilename = actualFilename || response.data.actualFilename;
+    }
+    
+    if (commits !== parts.length) {
+      throw new Error(`Expected one commit per chunk, got ${commits}`);
+    }
+    if (syncServer.pendingSyncs.size !== 0) {
+      throw new Error('An fsync was still pending after its chunk was acknowledged');
+    }
+    if (fs.readFileSync(path.join(outputDir, actualFilename), 'utf8') !== parts.join('')) {
+      throw new Error('Content mismatch!');
+    }
+    logSuccess('Every chunk committed before its response');
+  });
+}
+
+// Test 14: Output descriptors are cached per file, bounded, and not kept in ignore mode
+async function testOutputFileCache() {
+  logTest('Output Descriptor Cache');
+  
+  await withServer({ maxOpenFiles: 2 }, async (cacheServer, port) => {
+    const client = new IndexedCPClient({ apiKey: API_KEY });
+    const url = `http://localhost:${port}/upload`;
+    
+    const first = await client.uploadChunk(url, Buffer.from('a'), 0, 'cached.txt', API_KEY);
+    const outputFile = path.join(cacheServer.resolvedOutputDir, first.data.actualFilename);
+    const entry = cacheServer.openFiles.get(outputFile);
+    if (!entry || entry.writers !== 0) {
+      throw new Error('Descriptor not cached after the first chunk');
+    }
+    await client.uploadChunk(url, Buffer.from('b'), 1, 'cached.txt', API_KEY);
+    if (cacheServer.openFiles.get(outputFile) !== entry) {
+      throw new Error('Continuation chunk did not reuse the cached descriptor');
+    }
+    logSuccess('Continuation chunks reuse the cached descriptor');
+    
+    for (const name of ['other-1.txt', 'other-2.txt', 'other-3.txt']) {
+      await client.uploadChunk(url, Buffer.from(name), 0, name, API_KEY);
+    }
+    if (cacheServer.openFiles.size > 2) {
+      throw new Error(`Expected at most 2 cached descriptors, found ${cacheServer.openFiles.size}`);
+    }
+    logSuccess('Idle descriptors evicted beyond maxOpenFiles');
+  });
+  
+  await withServer({ pathMode: 'ignore' }, async (ignoreServer, port) => {
+    const client = new IndexedCPClient({ apiKey: API_KEY });
+    const url = `http://localhost:${port}/upload`;
+    for (let i = 0; i < 5; i++) {
+      await client.uploadChunk(url, Buffer.from(`chunk ${i}`), i, 'ignored.txt', API_KEY);
+    }
+    if (ignoreServer.openFiles.size !== 0) {
+      throw new Error(`Ignore mode kept ${ignoreServer.openFiles.size} descriptors open`);
+    }
+    logSuccess('Ignore mode closes each descriptor after its write');
+  });
+}
+
+// Test 15: Upload sessions beyond maxUploadSessions are evicted
+async function testUploadSessionLimit() {
+  logTest('Upload Session Limit');
+  
+  await withServer({ maxUploadSessions: 2 }, async (limitedServer, port) => {
+    const client = new IndexedCPClient({ apiKey: API_KEY });
+    const url = `http://localhost:${port}/upload`;
+    for (const name of ['session-1.txt', 'session-2.txt', 'session-3.txt']) {
+      await client.uploadChunk(url, Buffer.from(name), 0, name, API_KEY);
+    }
+    
+    const stats = limitedServer.getUploadSessionStats();
+    if (stats.activeUploadSessions !== 2 || stats.evictedUploadSessions !== 1) {
+      throw new Error(`Unexpected session stats: ${JSON.stringify(stats)}`);
+    }
+    logSuccess('Least recently used session evicted at the limit');
+    
+    // The evicted (oldest) session cannot be continued; the others can
+    await client.uploadChunk(url, Buffer.from(' more'), 1, 'session-3.txt', API_KEY);
+    try {
+      await client.uploadChunk(url, Buffer.from(' more'), 1, 'session-1.txt', API_KEY);
+      throw new Error('Chunk of an evicted session was accepted');
+    } catch (error) {
+      if (!error.message.includes('Conflict')) {
+        throw error;
+      }
+    }
+    logSuccess('Only the evicted session is rejected');
+  });
+}
+
+// Test 16: Health endpoint needs no API key
+async function testHealthCheck(server) {
+  logTest('Health Check');
+  
+  const { status, body } = await new Promise((resolve, reject) => {
+    http.get(`http://localhost:${TEST_PORT}/health`, (res) => {
+      let data = '';
+      res.on('data', chunk => data += chunk);
+      res.on('end', () => resolve({ status: res.statusCode, body: data }));
+    }).on('error', reject);
+  });
+  
+  if (status !== 200 || JSON.parse(body).status !== 'ok') {
+    throw new Error(`Unexpected health response: ${status} ${body}`);
+  }
+  logSuccess('Health check answered without authentication');
+}
+
 // Main test runner
 async function runAllTests() {
   log('\n' + '═'.repeat(60), 'yellow');
@@ -331,15 +713,9 @@ async function runAllTests() {
       pathMode: 'sanitize' // Use sanitize mode for these tests
     });
     
-    await new Promise((resolve) => {
-      server.listen(TEST_PORT, () => {
-        logSuccess(`Server started on port ${TEST_PORT}`);
-        resolve();
-      });
-    });
-    
-    // Give server a moment to fully initialize
-    await new Promise(resolve => setTimeout(resolve, 500));
+    // listen() resolves once the server is accepting connections
+    await server.listen(TEST_PORT);
+    logSuccess(`Server started on port ${TEST_PORT}`);
     
     // Run all tests
     const tests = [
@@ -349,7 +725,16 @@ async function runAllTests() {
       { name: 'Large File Upload', fn: testLargeFileUpload },
       { name: 'No API Key Error', fn: testNoApiKey },
       { name: 'Wrong API Key Error', fn: testWrongApiKey },
-      { name: 'Resume Upload', fn: testResumeUpload }
+      { name: 'Resume Upload', fn: testResumeUpload },
+      { name: 'Compressed Upload', fn: testCompressedUpload },
+      { name: 'Minimal Chunk Response', fn: testMinimalResponse },
+      { name: 'Evicted Upload Session', fn: testEvictedSession },
+      { name: 'Buffered Descriptor Upload', fn: testBufferedDescriptors },
+      { name: 'Content-Encoding Errors', fn: testContentEncodingErrors },
+      { name: 'Synchronous Writes', fn: testSyncWrites },
+      { name: 'Output Descriptor Cache', fn: testOutputFileCache },
+      { name: 'Upload Session Limit', fn: testUploadSessionLimit },
+      { name: 'Health Check', fn: testHealthCheck }
     ];
     
     for (const test of tests) {
@@ -54,6 +54,7 @@ async function runAllTests() {
     { script: './security-test.js', name: 'Security Tests' },
     { script: './test-restart-persistence.js', name: 'Restart Persistence Tests' },
     { script: './test-encryption.js', name: 'Encryption Tests' },
+    { script: './test-encrypted-db.js', name: 'EncryptedDB Storage Tests' },
     { script: './test-cli-ls.js', name: 'CLI ls Command Tests' }
   ];
 
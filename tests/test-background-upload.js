@@ -3,6 +3,7 @@ process.env.INDEXEDCP_TEST_MODE = 'true';
 
 const IndexedCPClient = require('../lib/client');
 const { IndexedCPServer } = require('../lib/server');
+const { openDB } = require('idb');
 const fs = require('fs');
 const path = require('path');
 
@@ -28,6 +29,102 @@ const testFile2 = path.join(TEST_DIR, 'test-file-2.txt');
 fs.writeFileSync(testFile1, 'Test content for background upload 1\n'.repeat(100));
 fs.writeFileSync(testFile2, 'Test content for background upload 2\n'.repeat(100));
 
+// Create a buffer with the version 1 schema: one 'chunks' store, no indexes,
+// retry state stored inline on the chunk
+async function createV1Buffer(dbName, fileName, parts, inlineRetry) {
+  const db = await openDB(dbName, 1, {
+    upgrade(db) {
+      db.createObjectStore('chunks', { keyPath: 'id', autoIncrement: true });
+    }
+  });
+  for (let i = 0; i < parts.length; i++) {
+    const record = { id: `${fileName}-${i}`, fileName, chunkIndex: i, data: Buffer.from(parts[i]) };
+    if (i === 1 && inlineRetry) {
+      record.retryMetadata = inlineRetry;
+    }
+    await db.put('chunks', record);
+  }
+  db.close();
+}
+
+// Buffers created at schema v1 upgrade to v4 and still upload
+async function testSchemaUpgrade() {
+  console.log('============================================================');
+  console.log('Test 3: Upload from a Version 1 Buffer');
+  console.log('============================================================');
+  
+  const port = TEST_PORT + 1;
+  const outputDir = path.join(TEST_DIR, 'upgrade-uploads');
+  const url = `http://localhost:${port}/upload`;
+  const parts = ['v1 chunk zero\n', 'v1 chunk one\n', 'v1 chunk two\n'];
+  const now = Date.now();
+  const inlineRetry = {
+    retryCount: 1,
+    lastAttempt: now - 2000,
+    nextRetry: now - 1000, // due
+    errors: [{ timestamp: now - 2000, message: 'offline' }]
+  };
+  
+  // Sanitize mode keeps each upload in one file
+  const server = new IndexedCPServer({ outputDir, port, apiKey: TEST_API_KEY, pathMode: 'sanitize' });
+  await server.listen(port);
+  
+  try {
+    // uploadBufferedFiles() on an upgraded buffer
+    await createV1Buffer('test-v1-buffered', 'v1-buffered.txt', parts, inlineRetry);
+    const client1 = new IndexedCPClient({ apiKey: TEST_API_KEY, dbName: 'test-v1-buffered' });
+    const db1 = await client1.initDB();
+    
+    if (db1.version !== 4 || !db1.objectStoreNames.contains('retries')) {
+      throw new Error(`Expected schema v4 with a retries store, got v${db1.version}`);
+    }
+    const chunkIndexes = db1.transaction('chunks').objectStore('chunks').indexNames;
+    const retryIndexes = db1.transaction('retries').objectStore('retries').indexNames;
+    if (!chunkIndexes.contains('byFile') || !retryIndexes.contains('byNextRetry') || !retryIndexes.contains('byRetryCount')) {
+      throw new Error('Upgrade did not create the v2-v4 indexes');
+    }
+    console.log('✓ Version 1 buffer upgraded to schema v4');
+    
+    const result = await client1.uploadBufferedFiles(url);
+    const uploaded = fs.readFileSync(path.join(outputDir, result['v1-buffered.txt']), 'utf8');
+    if (uploaded !== parts.join('')) {
+      throw new Error('uploadBufferedFiles() content mismatch after upgrade');
+    }
+    if (await db1.count('chunks') !== 0) {
+      throw new Error('Uploaded chunks left in the upgraded buffer');
+    }
+    console.log('✓ uploadBufferedFiles() uploaded the upgraded buffer');
+    
+    // Background pass on an upgraded buffer with inline retry state
+    await createV1Buffer('test-v1-background', 'v1-background.txt', parts, inlineRetry);
+    const client2 = new IndexedCPClient({
+      apiKey: TEST_API_KEY,
+      dbName: 'test-v1-background',
+      maxRetries: 5
+    });
+    const progress = [];
+    client2.onUploadProgress = (info) => progress.push(info);
+    await client2._processBackgroundUpload(url);
+    
+    const uploaded2 = fs.readFileSync(path.join(outputDir, 'v1-background.txt'), 'utf8');
+    if (uploaded2 !== parts.join('')) {
+      throw new Error('Background pass content mismatch after upgrade');
+    }
+    const db2 = await client2.initDB();
+    if (await db2.count('chunks') !== 0 || await db2.count('retries') !== 0) {
+      throw new Error('Chunks or retry state left after the background pass');
+    }
+    const retried = progress.find(p => p.chunkIndex === 1);
+    if (!retried || retried.status !== 'success' || retried.retryCount !== 1) {
+      throw new Error(`Inline retry state not honoured: ${JSON.stringify(retried)}`);
+    }
+    console.log('✓ Background pass uploaded it, honouring inline retry state');
+    console.log('✓ Test passed: Upload from a Version 1 Buffer\n');
+  } finally {
+    server.close();
+  }
+}
+
 async function runTest() {
   let server;
   
@@ -204,6 +301,8 @@ async function runTest() {
     
     console.log('✓ Test passed: Background Upload with Retry\n');
     
+    await testSchemaUpgrade();
+    
     console.log('═══════════════════════════════════════════════════════════════════');
     console.log('All Background Upload Tests Passed! 🎉');
     console.log('═══════════════════════════════════════════════════════════════════\n');
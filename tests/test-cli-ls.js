@@ -139,12 +139,12 @@ async function runTest() {
   // Test 4: Large file with multiple chunks
   console.log('Test 4: List file with multiple chunks');
   try {
-    // Create a 3MB file (will be split into 3 chunks)
+    // Create a 3MB file (split into 3 chunks with 1MB blocks)
     const largeBuffer = Buffer.alloc(3 * 1024 * 1024, 'X');
     fs.writeFileSync('test-large.bin', largeBuffer);
     
     // Add it to buffer
-    runCommand('node bin/indexcp add test-large.bin');
+    runCommand('node bin/indexcp add test-large.bin --io-block-size 1M');
     
     // List all files
     const output = runCommand('node bin/indexcp ls');
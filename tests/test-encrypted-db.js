@@ -0,0 +1,329 @@
+#!/usr/bin/env node
+'use strict';
+
+/**
+ * EncryptedDB storage tests: write ordering and coalescing, payload files,
+ * atomic writes, the store cache, and migration of stores written by older
+ * versions
+ */
+
+const fs = require('fs');
+const path = require('path');
+const os = require('os');
+const { EncryptedDB, openEncryptedDB } = require('../lib/encrypted-db');
+
+// Test utilities
+let testsPassed = 0;
+let testsFailed = 0;
+
+function assert(condition, message) {
+  if (!condition) {
+    console.error(`✗ ${message}`);
+    testsFailed++;
+    throw new Error(`Assertion failed: ${message}`);
+  }
+  testsPassed++;
+}
+
+function createTestDir() {
+  return fs.mkdtempSync(path.join(os.tmpdir(), 'indexcp-encrypted-db-'));
+}
+
+function cleanup(testDir) {
+  fs.rmSync(testDir, { recursive: true, force: true });
+}
+
+function createPacket(sessionId, seq, overrides = {}) {
+  return {
+    id: `${sessionId}-${seq}`,
+    sessionId,
+    seq,
+    iv: Buffer.from(`iv-${seq}`),
+    authTag: Buffer.from(`tag-${seq}`),
+    ciphertext: Buffer.from(`ciphertext ${sessionId} ${seq}`),
+    status: 'pending',
+    ...overrides
+  };
+}
+
+// Operations issued without awaiting apply in call order
+async function testConcurrentOrdering() {
+  console.log('\n🔀 Testing concurrent put/delete/get ordering...');
+  const testDir = createTestDir();
+
+  try {
+    const db = new EncryptedDB('test', 1, { dbPath: testDir });
+
+    const results = await Promise.all([
+      db.put('packets', createPacket('s', 0)),
+      db.put('packets', createPacket('s', 1)),
+      db.get('packets', 's-0'),
+      db.delete('packets', 's-0'),
+      db.get('packets', 's-0'),
+      db.put('packets', createPacket('s', 0, { status: 'failed' })),
+      db.put('packets', createPacket('s', 2)),
+      db.get('packets', 's-0'),
+      db.getAll('packets')
+    ]);
+
+    assert(results[2] && results[2].status === 'pending', 'Read before delete sees the first put');
+    assert(results[4] === undefined, 'Read after delete sees no record');
+    assert(results[7] && results[7].status === 'failed', 'Read after re-put sees the second put');
+    assert(results[8].length === 3, 'All three packets stored');
+    console.log('  ✓ Reads see every earlier write and no later one');
+
+    // A fresh instance reads the files, not the cache
+    const reopened = new EncryptedDB('test', 1, { dbPath: testDir });
+    const stored = await reopened.getAll('packets');
+    assert(stored.map(p => p.id).sort().join() === 's-0,s-1,s-2', 'Store file holds the final packets');
+    assert(stored.every(p => p.ciphertext.equals(createPacket('s', p.seq).ciphertext)), 'Payload files hold each ciphertext');
+    console.log('  ✓ Final state written to disk');
+
+    // Puts queued back to back share one store write
+    let saves = 0;
+    const saveStore = reopened.saveStore;
+    reopened.saveStore = function (...args) {
+      saves++;
+      return saveStore.apply(this, args);
+    };
+    await Promise.all([3, 4, 5, 6, 7].map(seq => reopened.put('packets', createPacket('s', seq))));
+    assert(saves === 1, `Five queued puts saved once (saved ${saves} times)`);
+    assert((await reopened.count('packets')) === 8, 'Coalesced puts all stored');
+    console.log('  ✓ Back-to-back puts coalesced into one write');
+  } finally {
+    cleanup(testDir);
+  }
+}
+
+// A record deleted and put back keeps its payload
+async function testDeleteThenPut() {
+  console.log('\n♻️  Testing delete then put of the same record...');
+  const testDir = createTestDir();
+
+  try {
+    const db = new EncryptedDB('test', 1, { dbPath: testDir });
+    const packet = createPacket('s', 0);
+    const payloadPath = db.getPayloadPath(packet.id);
+
+    await db.put('packets', packet);
+    await db.delete('packets', packet.id);
+    assert(!fs.existsSync(payloadPath), 'Payload file removed with its record');
+
+    await db.put('packets', packet);
+    let stored = await db.get('packets', packet.id);
+    assert(stored && Buffer.isBuffer(stored.ciphertext), 'Ciphertext restored after re-put');
+    assert(stored.ciphertext.equals(packet.ciphertext), 'Restored ciphertext matches');
+    assert(fs.existsSync(payloadPath), 'Payload file rewritten');
+    console.log('  ✓ Re-put after delete()');
+
+    await db.cleanupSession('s');
+    await db.put('packets', packet);
+    stored = await db.get('packets', packet.id);
+    assert(stored && stored.ciphertext.equals(packet.ciphertext), 'Ciphertext restored after cleanupSession()');
+    console.log('  ✓ Re-put after cleanupSession()');
+
+    // A status update without the payload keeps the payload file
+    const { ciphertext, ...update } = stored;
+    await db.put('packets', { ...update, status: 'uploaded' });
+    stored = await db.get('packets', packet.id);
+    assert(stored.status === 'uploaded', 'Status updated');
+    assert(stored.ciphertext.equals(packet.ciphertext), 'Payload kept by a put without it');
+    console.log('  ✓ Put without the payload keeps it');
+  } finally {
+    cleanup(testDir);
+  }
+}
+
+// A write that fails part-way leaves the previous files intact
+async function testAtomicWrites() {
+  console.log('\n💾 Testing atomic store and payload writes...');
+  const testDir = createTestDir();
+  const rename = fs.promises.rename;
+
+  try {
+    const db = new EncryptedDB('test', 1, { dbPath: testDir });
+    await db.put('packets', createPacket('s', 0));
+
+    // The store file is never replaced: as if the process died before rename
+    fs.promises.rename = async (from, to) => {
+      if (to.endsWith('packets.json')) {
+        throw new Error('simulated crash');
+      }
+      return rename(from, to);
+    };
+    let failed = false;
+    try {
+      await db.put('packets', createPacket('s', 1));
+    } catch (error) {
+      failed = error.message === 'simulated crash';
+    }
+    fs.promises.rename = rename;
+    assert(failed, 'Interrupted write rejected');
+
+    const leftovers = [...fs.readdirSync(testDir), ...fs.readdirSync(db.payloadsPath)].filter(name => name.endsWith('.tmp'));
+    assert(leftovers.length === 0, `No temp files left behind (found ${leftovers.join(', ')})`);
+
+    const reopened = new EncryptedDB('test', 1, { dbPath: testDir });
+    const stored = await reopened.getAll('packets');
+    assert(stored.length === 1 && stored[0].id === 's-0', 'Store file still holds the previous contents');
+    assert(stored[0].ciphertext.equals(createPacket('s', 0).ciphertext), 'Payload of the stored packet intact');
+    console.log('  ✓ Interrupted write keeps the previous store');
+
+    await reopened.put('packets', createPacket('s', 1));
+    assert((await reopened.count('packets')) === 2, 'Next write succeeds');
+    console.log('  ✓ Later writes unaffected');
+  } finally {
+    fs.promises.rename = rename;
+    cleanup(testDir);
+  }
+}
+
+// Records handed out are copies of the cached store
+async function testCacheIsolation() {
+  console.log('\n🧊 Testing store cache isolation...');
+  const testDir = createTestDir();
+
+  try {
+    const db = new EncryptedDB('test', 1, { dbPath: testDir });
+    const packet = createPacket('s', 0, { retryMetadata: { retryCount: 1, errors: [] } });
+    await db.put('packets', packet);
+
+    // Changes to the caller's record after put
+    packet.retryMetadata.retryCount = 9;
+    packet.iv[0] = 0;
+
+    // Changes to a loaded record that is never saved
+    const [loaded] = await db.getAllFromIndex('packets', 'status', 'pending');
+    loaded.retryMetadata.retryCount = 5;
+    loaded.retryMetadata.errors.push({ message: 'unsaved' });
+
+    const stored = await db.get('packets', 's-0');
+    assert(stored.retryMetadata.retryCount === 1, 'Nested fields not shared with callers');
+    assert(stored.retryMetadata.errors.length === 0, 'Nested arrays not shared with callers');
+    assert(Buffer.isBuffer(stored.iv) && stored.iv.toString() === 'iv-0', 'Buffers copied as Buffers');
+    console.log('  ✓ Unsaved changes never reach the cache');
+
+    // Another instance writing the store invalidates this one's cache
+    const other = new EncryptedDB('test', 1, { dbPath: testDir });
+    await other.put('packets', createPacket('s', 1));
+    assert((await db.count('packets')) === 2, 'Write by another instance is seen');
+    console.log('  ✓ External writes invalidate the cache');
+
+    // A same-size rewrite within one mtime tick, as on coarse-mtime filesystems
+    const storePath = path.join(testDir, 'packets.json');
+    const tick = new Date(Math.floor(Date.now() / 1000) * 1000);
+    fs.utimesSync(storePath, tick, tick);
+    assert((await db.get('packets', 's-1')).status === 'pending', 'Store cached at the pinned mtime');
+    const { size } = fs.statSync(storePath);
+    await other.put('packets', createPacket('s', 1, { status: 'PENDING' }));
+    fs.utimesSync(storePath, tick, tick);
+    assert(fs.statSync(storePath).size === size, 'Rewrite kept the store size');
+    assert((await db.get('packets', 's-1')).status === 'PENDING', 'Same-size, same-mtime write is seen');
+    console.log('  ✓ Same-size rewrites within one mtime tick invalidate the cache');
+  } finally {
+    cleanup(testDir);
+  }
+}
+
+// Stores written by older versions are migrated on open
+async function testLegacyMigration() {
+  console.log('\n📦 Testing legacy store migration...');
+  const testDir = createTestDir();
+
+  try {
+    // Buffers in JSON.stringify's byte-array form, ciphertext inline
+    const legacy = [0, 1].map(seq => ({
+      id: `s-${seq}`,
+      sessionId: 's',
+      seq,
+      iv: { type: 'Buffer', data: [...Buffer.from(`iv-${seq}`)] },
+      ciphertext: { type: 'Buffer', data: [...Buffer.from(`legacy ${seq}`)] },
+      status: 'pending'
+    }));
+    fs.writeFileSync(path.join(testDir, 'packets.json'), JSON.stringify(legacy, null, 2));
+
+    const db = await openEncryptedDB('test', 1, { dbPath: testDir });
+
+    const data = fs.readFileSync(path.join(testDir, 'packets.json'), 'utf8');
+    assert(!/"data":\s*\[/.test(data), 'Byte arrays rewritten as base64');
+    assert(!data.includes('ciphertext'), 'Ciphertext moved out of the store file');
+    assert(fs.existsSync(db.getPayloadPath('s-0')) && fs.existsSync(db.getPayloadPath('s-1')), 'Payload files written');
+
+    const packets = await db.getAll('packets');
+    assert(packets.length === 2, 'Both packets kept');
+    for (const packet of packets) {
+      assert(Buffer.isBuffer(packet.iv) && packet.iv.toString() === `iv-${packet.seq}`, 'Legacy Buffer field restored');
+      assert(Buffer.isBuffer(packet.ciphertext) && packet.ciphertext.toString() === `legacy ${packet.seq}`, 'Legacy ciphertext restored');
+    }
+    console.log('  ✓ Byte-array and inline payload store migrated');
+  } finally {
+    cleanup(testDir);
+  }
+}
+
+// Counts follow puts, status updates and deletes
+async function testCounts() {
+  console.log('\n🔢 Testing count and countFromIndex...');
+  const testDir = createTestDir();
+
+  try {
+    const db = new EncryptedDB('test', 1, { dbPath: testDir });
+    await db.putMany('packets', [0, 1, 2, 3].map(seq => createPacket('s', seq)));
+    await db.put('sessions', { sessionId: 's', kid: 'k', createdAt: Date.now() });
+
+    assert((await db.count('packets')) === 4, 'Four packets counted');
+    assert((await db.count('sessions')) === 1, 'One session counted');
+    assert((await db.countFromIndex('packets', 'status', 'pending')) === 4, 'All packets pending');
+
+    await db.updatePacketStatus('s-0', 'uploaded');
+    const { ciphertext, ...failed } = await db.get('packets', 's-1');
+    await db.put('packets', { ...failed, status: 'failed' });
+
+    assert((await db.countFromIndex('packets', 'status', 'pending')) === 2, 'Pending count after updates');
+    assert((await db.countFromIndex('packets', 'status', 'uploaded')) === 1, 'Uploaded count after updatePacketStatus()');
+    assert((await db.countFromIndex('packets', 'status', 'failed')) === 1, 'Failed count after put()');
+
+    await db.delete('packets', 's-2');
+    assert((await db.count('packets')) === 3, 'Count after delete');
+    assert((await db.countFromIndex('packets', 'status', 'pending')) === 1, 'Pending count after delete');
+    assert((await db.countFromIndex('packets', 'status', 'missing')) === 0, 'Unknown value counts zero');
+    console.log('  ✓ Counts follow every update');
+  } finally {
+    cleanup(testDir);
+  }
+}
+
+// Main test runner
+async function runTests() {
+  console.log('🧪 EncryptedDB Storage Tests\n');
+  console.log('='.repeat(50));
+
+  try {
+    await testConcurrentOrdering();
+    await testDeleteThenPut();
+    await testAtomicWrites();
+    await testCacheIsolation();
+    await testLegacyMigration();
+    await testCounts();
+
+    console.log('\n' + '='.repeat(50));
+    console.log(`\n✅ All tests passed! (${testsPassed} assertions)`);
+    process.exit(0);
+  } catch (error) {
+    console.error('\n' + '='.repeat(50));
+    console.error(`\n✗ Tests failed: ${error.message}`);
+    console.error(`   Tests passed: ${testsPassed}`);
+    console.error(`   Tests failed: ${testsFailed}`);
+    process.exit(1);
+  }
+}
+
+// Run if called directly
+if (require.main === module) {
+  runTests().catch(error => {
+    console.error('Fatal error:', error);
+    process.exit(1);
+  });
+}
+
+module.exports = { runTests };
@@ -10,6 +10,10 @@ process.env.INDEXEDCP_TEST_MODE = 'true';
 const fs = require('fs');
 const path = require('path');
 const os = require('os');
+
+// Keep encrypted buffers in the test directory, not the user's ~/.indexcp
+const TEST_DIR = path.join(os.tmpdir(), 'indexcp-encryption-test');
+process.env.INDEXEDCP_ENCRYPTED_DB_PATH = path.join(TEST_DIR, 'encrypted-db');
 const assert = require('assert');
 const IndexedCPClient = require('../lib/client');
 const { IndexedCPServer } = require('../lib/server');
@@ -30,7 +34,7 @@ function log(msg, color = 'reset') {
 
 class EncryptionTestSuite {
   constructor() {
-    this.testDir = path.join(os.tmpdir(), 'indexcp-encryption-test');
+    this.testDir = TEST_DIR;
     this.serverOutputDir = path.join(this.testDir, 'server-output');
     this.testFiles = path.join(this.testDir, 'test-files');
     this.server = null;
@@ -51,12 +55,6 @@ class EncryptionTestSuite {
     fs.mkdirSync(this.serverOutputDir, { recursive: true });
     fs.mkdirSync(this.testFiles, { recursive: true });
 
-    // Clean encrypted DB
-    const encDbPath = path.join(os.homedir(), '.indexcp', 'encrypted-db');
-    if (fs.existsSync(encDbPath)) {
-      fs.rmSync(encDbPath, { recursive: true, force: true });
-    }
-
     // Create test file
     this.testFile = path.join(this.testFiles, 'test-data.txt');
     this.testContent = 'This is secret test data that should be encrypted!\n'.repeat(100);
@@ -75,12 +73,6 @@ class EncryptionTestSuite {
     if (fs.existsSync(this.testDir)) {
       fs.rmSync(this.testDir, { recursive: true, force: true });
     }
-
-    // Clean encrypted DB
-    const encDbPath = path.join(os.homedir(), '.indexcp', 'encrypted-db');
-    if (fs.existsSync(encDbPath)) {
-      fs.rmSync(encDbPath, { recursive: true, force: true });
-    }
     
     log('✓ Cleanup complete\n', 'green');
   }
@@ -134,6 +126,11 @@ class EncryptionTestSuite {
       assert(keyInfo.publicKey, 'Public key should be fetched');
       assert(keyInfo.kid, 'Key ID should be present');
       assert(cryptoUtils.isValidKeyId(keyInfo.kid), 'Key ID should be valid');
+      assert.deepStrictEqual(
+        cryptoUtils.isValidKeyIds([keyInfo.kid, 'not-a-key-id']),
+        [true, false],
+        'Bulk key ID validation should match per-ID validation'
+      );
       
       // Verify cached (note: these are async getters, need to await)
       const cachedKey = await client.cachedPublicKey;
@@ -424,6 +421,92 @@ class EncryptionTestSuite {
     });
   }
 
+  // ===== Additional test: AAD binary round-trip =====
+  async testAADBinaryRoundTrip() {
+    await this.test('Binary AAD round-trips through parseAAD', async () => {
+      const sessionId = cryptoUtils.generateSessionId();
+      const cases = [
+        { seq: 0, timestamp: Date.now() },
+        // Values past 2^32 exercise the high uint32 halves
+        { seq: 2 ** 40 + 7, timestamp: Number.MAX_SAFE_INTEGER }
+      ];
+      for (const { seq, timestamp } of cases) {
+        const aad = cryptoUtils.buildAAD(sessionId, seq, 'gzip', timestamp);
+        assert.strictEqual(aad.length, 36, 'AAD should use the binary layout');
+        assert.deepStrictEqual(cryptoUtils.parseAAD(aad), { sessionId, seq, codec: 'gzip', timestamp });
+      }
+
+      // Values the uint64 fields cannot hold exactly use the JSON form
+      for (const [seq, timestamp] of [[-1, Date.now()], [0, -5], [2 ** 53, 0], [1.5, 0]]) {
+        const aad = cryptoUtils.buildAAD(sessionId, seq, 'raw', timestamp);
+        assert.strictEqual(aad[0], '{'.charCodeAt(0), `seq ${seq} / timestamp ${timestamp} should fall back to JSON`);
+        assert.deepStrictEqual(cryptoUtils.parseAAD(aad), { sessionId, seq, codec: 'raw', timestamp });
+      }
+
+      // Bytes the layout does not define are rejected, not passed through
+      const unknownCodec = cryptoUtils.buildAAD(sessionId, 1, 'raw', Date.now());
+      unknownCodec[1] = 9;
+      assert.throws(() => cryptoUtils.parseAAD(unknownCodec), /Unknown AAD codec id/);
+      const reserved = cryptoUtils.buildAAD(sessionId, 1, 'raw', Date.now());
+      reserved[2] = 1;
+      assert.throws(() => cryptoUtils.parseAAD(reserved), /reserved bytes/);
+
+      log('  ✓ Binary AAD and out-of-range fallback parse back exactly', 'green');
+    });
+  }
+
+  // ===== Additional test: AAD format negotiation =====
+  async testAADNegotiation() {
+    await this.test('Binary AAD only for servers that advertise it', async () => {
+      const client = new IndexedCPClient({
+        dbName: 'test-aad-formats',
+        apiKey: this.apiKey,
+        serverUrl: `http://localhost:${this.port}`,
+        encryption: true
+      });
+
+      const keyInfo = await client.fetchPublicKey();
+      assert.deepStrictEqual(keyInfo.aadFormats, ['json', 'binary'], 'Server should advertise binary AAD');
+      const binarySession = await client.startStream('binary-aad.txt');
+      await client.addPacket(binarySession, Buffer.from('binary AAD packet'));
+
+      // The same key as cached from a server that does not list aadFormats
+      const db = await client.initDB();
+      const { binaryAAD, ...olderKey } = await client.getCachedPublicKey();
+      await db.put('keyCache', olderKey);
+      const jsonSession = await client.startStream('json-aad.txt');
+      await client.addPacket(jsonSession, Buffer.from('JSON AAD packet'));
+
+      const packets = await db.getAll('packets');
+      const packetOf = (sessionId) => packets.find(packet => packet.sessionId === sessionId);
+      assert.strictEqual(packetOf(binarySession).aad.length, 36, 'Advertising server should get binary AAD');
+      assert.strictEqual(packetOf(jsonSession).aad[0], '{'.charCodeAt(0), 'Older server should get JSON AAD');
+
+      // Either form authenticates its packet
+      for (const sessionId of [binarySession, jsonSession]) {
+        const { ciphertext, iv, authTag, aad } = packetOf(sessionId);
+        cryptoUtils.decryptPacket(ciphertext, client.sessionKeys.get(sessionId), iv, authTag, aad);
+        await db.cleanupSession(sessionId);
+      }
+
+      log('  ✓ AAD form follows the server\'s aadFormats', 'green');
+    });
+  }
+
+  // ===== Additional test: Legacy JSON AAD =====
+  async testLegacyJSONAAD() {
+    await this.test('parseAAD accepts legacy JSON AAD', async () => {
+      const legacy = { sessionId: 'legacy-session', seq: 3, codec: 'raw', timestamp: 1700000000000 };
+      assert.deepStrictEqual(cryptoUtils.parseAAD(Buffer.from(JSON.stringify(legacy))), legacy);
+
+      // A session ID outside the binary layout still builds JSON AAD
+      const aad = cryptoUtils.buildAAD(legacy.sessionId, legacy.seq, legacy.codec, legacy.timestamp);
+      assert.deepStrictEqual(cryptoUtils.parseAAD(aad), legacy);
+
+      log('  ✓ Legacy JSON AAD parsed', 'green');
+    });
+  }
+
   // ===== Additional test: Encryption status API =====
   async testEncryptionStatus() {
     await this.test('Encryption status and stats', async () => {
@@ -480,6 +563,9 @@ class EncryptionTestSuite {
       // Run additional tests
       await this.testSessionKeyMemory();
       await this.testIVUniqueness();
+      await this.testAADBinaryRoundTrip();
+      await this.testAADNegotiation();
+      await this.testLegacyJSONAAD();
       await this.testEncryptionStatus();
 
     } finally {
@@ -22,6 +22,16 @@ function assert(condition, message) {
   testsPassed++;
 }
 
+// One RSA key pair shared by the keystore tests; none of them modify it,
+// and generating a pair is the slowest step of the suite
+let testKeyPair = null;
+function getTestKeyPair() {
+  if (!testKeyPair) {
+    testKeyPair = cryptoUtils.generateServerKeyPair();
+  }
+  return testKeyPair;
+}
+
 async function cleanup(testDir) {
   try {
     await fs.rm(testDir, { recursive: true, force: true });
@@ -45,7 +55,7 @@ async function testFileSystemKeyStore() {
     await keystore.initialize();
     
     // Test save and load
-    const keyPair = await cryptoUtils.generateServerKeyPair();
+    const keyPair = await getTestKeyPair();
     const keyData = {
       kid: keyPair.kid,
       publicKey: keyPair.publicKey,
@@ -107,7 +117,7 @@ async function testMemoryKeyStore() {
   await keystore.initialize();
   
   // Test save and load
-  const keyPair = await cryptoUtils.generateServerKeyPair();
+  const keyPair = await getTestKeyPair();
   const keyData = {
     kid: keyPair.kid,
     publicKey: keyPair.publicKey,
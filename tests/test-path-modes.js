@@ -164,15 +164,8 @@ async function runTests() {
         pathMode: test.mode
       });
       
-      await new Promise((resolve, reject) => {
-        server.listen(TEST_PORT, (err) => {
-          if (err) reject(err);
-          else resolve();
-        });
-      });
-
-      // Wait for server to be ready
-      await new Promise(resolve => setTimeout(resolve, 200));
+      // listen() resolves once the server is accepting connections
+      await server.listen(TEST_PORT);
 
       // Upload file
       const result = await uploadFile(TEST_PORT, test.filename, test.content, API_KEY);
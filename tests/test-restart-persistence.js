@@ -217,10 +217,7 @@ async function testRestartPersistence() {
       apiKey: 'test-restart-key'
     });
     
-    await new Promise((resolve) => {
-      server.listen(3456);
-      setTimeout(resolve, 500); // Give server time to start
-    });
+    await server.listen(3456);
     
     log('✓ Test server started on port 3456', 'green');
     